@@ -0,0 +1,144 @@
+# batch_reports.py – render many PDF reports on a process pool
+#
+#   python batch_reports.py site_a.db site_b.db --from 2026-09-07 --to 2026-10-04
+#   python batch_reports.py --jobs jobs.csv --workers 8     # columns: db,start,end[,output]
+#
+# One report per (database, date range) job; --from/--to are cut into
+# --days long ranges (weekly by default). Each database is read once - stock
+# summary, forecast chart and the inventory rows covering all of its jobs -
+# and each job renders its own slice in a worker. Workers are spawned fresh
+# with the Agg backend, so no matplotlib or Tk state is shared between them.
+# Site databases are opened read-only and must already be at the current
+# schema version; the demand models are cached in a scratch directory.
+import argparse
+import bisect
+import csv
+import hashlib
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import model
+
+def _init_worker():
+    os.environ["MPLBACKEND"] = "Agg"
+
+def read_site(db, first, last, cache_dir):
+    """Read what the reports for *db* need: (summary, chart_png, rows).
+
+    rows are (day, blood_type, units) for donations between day numbers
+    *first* and *last*, ordered by day. *db* is opened read-only and is
+    refused unless its schema is at model.SCHEMA_VERSION; its demand model
+    is cached in *cache_dir* under a name of its own."""
+    path = os.path.abspath(db)
+    model.DB_NAME = f"file:{quote(path)}?mode=ro"
+    model.MODEL_PATH = os.path.join(
+        cache_dir, hashlib.sha1(path.encode()).hexdigest()[:16] + ".demand_model.pkl")
+    try:
+        try:
+            version = model.execute("PRAGMA user_version")[0][0]
+        except sqlite3.OperationalError as exc:
+            raise ValueError(f"{db}: {exc}") from None
+        if version != model.SCHEMA_VERSION:
+            raise ValueError(f"{db}: schema version {version}, expected "
+                             f"{model.SCHEMA_VERSION}; open it in the application "
+                             "once to migrate it")
+        rows = model.execute("""SELECT donation_date, blood_type, units FROM inventory
+                                WHERE donation_date BETWEEN ? AND ?
+                                ORDER BY donation_date""", (first, last))
+        return model.stock_summary(), model.forecast_png(), rows
+    finally:
+        model.close_connections()
+
+def render_job(output, summary, chart_png, rows, first, last):
+    """Render one report from rows already read; returns (output, rows, pages, seconds)."""
+    start = time.perf_counter()
+    rows = [(bt, model.from_day(day).isoformat(), units)
+            for day, bt, units in sorted(rows, key=lambda r: (r[1], r[0]))]
+    n, pages = model.render_pdf_report(output, summary, chart_png, rows,
+                                       (model.from_day(first), model.from_day(last)))
+    return output, n, pages, time.perf_counter() - start
+
+def run_batch(jobs, workers=None):
+    """Render (db, start, end, output) jobs; yields render_job() results as they finish."""
+    by_db = defaultdict(list)
+    for db, start, end, output in jobs:
+        by_db[db].append((model.to_day(start), model.to_day(end), output))
+    with tempfile.TemporaryDirectory(prefix="blood-reports-") as cache_dir, \
+         ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker) as pool:
+        reads = {pool.submit(read_site, db, min(s for s, _, _ in site_jobs),
+                             max(e for _, e, _ in site_jobs), cache_dir): db
+                 for db, site_jobs in by_db.items()}
+        renders = []
+        for fut in as_completed(reads):
+            summary, chart_png, rows = fut.result()
+            days = [row[0] for row in rows]
+            for first, last, output in by_db[reads[fut]]:
+                part = rows[bisect.bisect_left(days, first):bisect.bisect_right(days, last)]
+                renders.append(pool.submit(render_job, output, summary, chart_png,
+                                           part, first, last))
+        for fut in as_completed(renders):
+            yield fut.result()
+
+def weekly_jobs(dbs, start, end, days, out_dir):
+    """Split [start, end] into *days* long ranges for every database."""
+    jobs = []
+    for db in dbs:
+        site = os.path.splitext(os.path.basename(db))[0]
+        first = start
+        while first <= end:
+            last = min(first + timedelta(days=days - 1), end)
+            jobs.append((db, first, last, os.path.join(out_dir, f"{site}_{first}_{last}.pdf")))
+            first = last + timedelta(days=1)
+    return jobs
+
+def read_jobs(path, out_dir):
+    jobs = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            db, start, end = row["db"], row["start"], row["end"]
+            site = os.path.splitext(os.path.basename(db))[0]
+            output = row.get("output") or os.path.join(out_dir, f"{site}_{start}_{end}.pdf")
+            jobs.append((db, start, end, output))
+    return jobs
+
+def main(argv=None):
+    today = date.today()
+    parser = argparse.ArgumentParser(description="Render PDF reports for many date ranges")
+    parser.add_argument("dbs", nargs="*", default=[model.DB_NAME])
+    parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                        default=today - timedelta(days=27))
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=today)
+    parser.add_argument("--days", type=int, default=7, help="length of each report's range")
+    parser.add_argument("--jobs", help="CSV of db,start,end[,output] instead of the ranges")
+    parser.add_argument("--out", default="reports", help="directory for generated reports")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    if args.jobs:
+        jobs = read_jobs(args.jobs, args.out)
+    else:
+        jobs = weekly_jobs(args.dbs, args.start, args.end, args.days, args.out)
+    start = time.perf_counter()
+    busy = 0.0
+    try:
+        for output, rows, pages, seconds in run_batch(jobs, args.workers):
+            busy += seconds
+            print(f"  {output:<48} {rows:>8} rows {pages:>5} pages {seconds:7.2f} s")
+    except ValueError as exc:
+        sys.exit(f"batch_reports: {exc}")
+    wall = time.perf_counter() - start
+    print(f"{len(jobs)} reports in {wall:.2f} s on {args.workers} workers "
+          f"({busy:.2f} s of rendering, {busy / wall if wall else 0:.1f}x parallel)")
+
+if __name__ == "__main__":
+    main()
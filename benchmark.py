@@ -0,0 +1,181 @@
+# benchmark.py – synthetic-data benchmarks for model.py
+#
+#   python benchmark.py                                   # 10^3, 10^4, 10^5 rows
+#   python benchmark.py --sizes 1000 1000000 --out bench.json
+#   python benchmark.py --skip pdf excel_export excel_import
+#   python benchmark.py --compare before.json after.json  # flag regressions
+#
+# For every size a scratch database is filled with that many donors,
+# recipients and inventory batches (realistic blood type mix, a year of
+# requests, daily batches), then the core operations are timed against it.
+# Results go to a JSON file, one record per (size, benchmark), so runs can
+# be compared with --compare.
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import model
+
+# Approximate donor population share per blood type.
+TYPE_MIX = {"O+": 38, "A+": 34, "B+": 9, "O-": 7, "A-": 6, "AB+": 3, "B-": 2, "AB-": 1}
+
+BENCHMARKS = ["execute_point", "execute_scan", "record_donation", "allocate",
+              "process_transfusion", "eligible_donors", "search_donors",
+              "get_inventory_cold", "get_inventory",
+              "excel_export", "excel_import", "train_demand_model", "pdf"]
+
+def populate(n, rng):
+    """Insert n donors, n recipients and ~n inventory batches; returns seconds."""
+    types, weights = list(TYPE_MIX), list(TYPE_MIX.values())
+    today = model.today_day()
+    start = time.perf_counter()
+    with model.transaction("IMMEDIATE"):
+        model.executemany("""INSERT INTO donors (donor_id, name, blood_type, last_donation)
+                              VALUES (?,?,?,?)""", (
+            (f"D{i}", f"Donor {i}", bt,
+             today - rng.randrange(730) if rng.random() < 0.7 else None)
+            for i, bt in enumerate(rng.choices(types, weights, k=n))))
+        model.executemany("""INSERT INTO recipients (recipient_id, name, blood_type,
+                                                     required_units, request_date)
+                              VALUES (?,?,?,?,?)""", (
+            (f"R{i}", f"Recipient {i}", bt, rng.choice((1, 1, 2, 2, 2, 3, 4)),
+             today - rng.randrange(365))
+            for i, bt in enumerate(rng.choices(types, weights, k=n))))
+        # the inventory holds one batch per (type, day), so n batches span n/8 days
+        model.executemany("INSERT INTO inventory VALUES (?,?,?)", (
+            (bt, today - i // len(types), rng.randint(1, 3 * TYPE_MIX[bt]))
+            for i, bt in zip(range(n), types * (n // len(types) + 1))))
+    return time.perf_counter() - start
+
+def timed(fn, calls):
+    """Run fn(*args) for every args in *calls*; returns per-call seconds."""
+    laps = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        laps.append(time.perf_counter() - start)
+    return laps
+
+def summarize(size, name, laps, rows=None):
+    laps = sorted(laps)
+    total = sum(laps)
+    return {"size": size, "name": name, "ops": len(laps), "total_s": total,
+            "mean_ms": total / len(laps) * 1000,
+            "p50_ms": laps[len(laps) // 2] * 1000,
+            "p95_ms": laps[min(len(laps) - 1, int(len(laps) * 0.95))] * 1000,
+            "ops_per_s": len(laps) / total if total else None,
+            "rows": rows}
+
+def run_size(n, ops, skip, workdir, seed):
+    rng = random.Random(seed)
+    model.DB_NAME = os.path.join(workdir, f"bench_{n}.db")
+    model.MODEL_PATH = os.path.join(workdir, f"bench_{n}.pkl")
+    model.init_db()
+    results = [summarize(n, "populate", [populate(n, rng)], rows=3 * n)]
+    today = model.today_day()
+    bench = {}
+    bench["execute_point"] = lambda: timed(model.execute, (
+        ("SELECT name, blood_type, last_donation FROM donors WHERE donor_id=?",
+         (f"D{rng.randrange(n)}",)) for _ in range(ops)))
+    bench["execute_scan"] = lambda: timed(model.execute, [
+        ("SELECT blood_type, SUM(required_units) FROM recipients GROUP BY blood_type",)] * 5)
+    bench["record_donation"] = lambda: timed(model.record_donation, (
+        (f"D{rng.randrange(n)}", rng.randint(1, 3), today - rng.randrange(30))
+        for _ in range(ops)))
+    bench["allocate"] = lambda: timed(model.allocate, (
+        (rng.choices(list(TYPE_MIX), list(TYPE_MIX.values()))[0], rng.randint(1, 3))
+        for _ in range(ops)))
+    bench["process_transfusion"] = lambda: timed(model.process_transfusion, (
+        (f"R{rng.randrange(n)}",) for _ in range(ops)))
+    bench["eligible_donors"] = lambda: timed(model.eligible_donors, (
+        (rng.choice(list(TYPE_MIX)),) for _ in range(ops)))
+    bench["search_donors"] = lambda: timed(model.search_donors, (
+        (f"Donor {rng.randrange(n)}",) for _ in range(ops)))
+
+    def get_inventory_cold():
+        laps = []
+        for _ in range(3):
+            model.INVENTORY.version = None      # force a reload from the table
+            laps += timed(model.get_inventory, [()])
+        return laps
+    bench["get_inventory_cold"] = get_inventory_cold
+    bench["get_inventory"] = lambda: timed(model.get_inventory, [()] * 5)
+    xlsx = os.path.join(workdir, f"bench_{n}.xlsx")
+    bench["excel_export"] = lambda: timed(model.stream_inventory_export, [(xlsx,)])
+    bench["excel_import"] = lambda: timed(model.bulk_import_excel, [(xlsx,)])
+    bench["train_demand_model"] = lambda: timed(model.train_demand_model, [()] * 3)
+    bench["pdf"] = lambda: timed(model.build_pdf_report,
+                                 [(os.path.join(workdir, f"bench_{n}.pdf"),)])
+
+    for name in BENCHMARKS:
+        if name in skip or (name == "excel_import" and "excel_export" in skip):
+            continue
+        rows = model.execute("SELECT COUNT(*) FROM inventory")[0][0]
+        results.append(summarize(n, name, bench[name](), rows=rows))
+        r = results[-1]
+        print(f"  {n:>8} {name:<20} {r['ops']:>5} ops  mean {r['mean_ms']:10.3f} ms  "
+              f"p95 {r['p95_ms']:10.3f} ms", flush=True)
+    model.close_connections()
+    return results
+
+def compare(before_path, after_path, tolerance):
+    """Print mean-time ratios; returns True if nothing slowed beyond *tolerance*."""
+    def load(path):
+        with open(path, encoding="utf-8") as fh:
+            return {(r["size"], r["name"]): r for r in json.load(fh)["results"]}
+    before, after = load(before_path), load(after_path)
+    ok = True
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key]["mean_ms"] / before[key]["mean_ms"] if before[key]["mean_ms"] else 1.0
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag, ok = "  REGRESSION", False
+        print(f"  {key[0]:>8} {key[1]:<20} {before[key]['mean_ms']:10.3f} -> "
+              f"{after[key]['mean_ms']:10.3f} ms  x{ratio:5.2f}{flag}")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model.py on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ops", type=int, default=200,
+                        help="calls per single-row benchmark")
+    parser.add_argument("--skip", nargs="*", default=[], choices=BENCHMARKS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch databases")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown for --compare (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.tolerance) else 1)
+
+    workdir = tempfile.mkdtemp(prefix="blood-bench-")
+    results = []
+    try:
+        for n in args.sizes:
+            results += run_size(n, args.ops, set(args.skip), workdir, args.seed)
+    finally:
+        if args.keep:
+            print(f"Scratch files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    meta = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "args": vars(args)}
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "results": results}, fh, indent=2)
+    print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# blood_service.py – headless JSON/HTTP front end for model.py
+#
+#   python blood_service.py --port 8080 --db blood_bank.db
+#
+# Endpoints (JSON in, JSON out):
+#   GET  /stock                      units in stock per blood type
+#   GET  /inventory                  batches per blood type, oldest first
+#   GET  /forecast                   predicted demand per blood type
+#   GET  /donors/<id>                GET /recipients/<id>
+#   POST /donors        {donor_id, name, blood_type}
+#   POST /donations     {donor_id, units, donation_date?}
+#   POST /recipients    {recipient_id, name, blood_type, required_units}
+#   POST /transfusions  {recipient_id}
+#
+# Reads run concurrently on a thread pool (each thread has its own pooled
+# SQLite connection, WAL lets them proceed alongside a writer). Every write
+# goes through one asyncio queue drained by a single writer thread, so the
+# service never contends with itself for the SQLite write lock. Expired stock
+# is swept to the waste table at startup and then every SWEEP_INTERVAL.
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import model
+
+SWEEP_INTERVAL = 60 * 60     # seconds
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+
+# -------------------------------------------------
+# Handlers (plain functions, run off the event loop)
+# -------------------------------------------------
+def _field(body, name, kind=str):
+    try:
+        value = body[name]
+    except (KeyError, TypeError):
+        raise ValueError(f"missing field '{name}'") from None
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"field '{name}' must be {kind.__name__}") from None
+
+def _units(body, name):
+    units = _field(body, name, int)
+    if units <= 0:
+        raise ValueError(f"field '{name}' must be a positive integer")
+    return units
+
+def get_stock(body):
+    return 200, model.stock_levels()
+
+def get_inventory(body):
+    return 200, {bt: [{"donation_date": d.strftime("%Y-%m-%d"), "units": u} for d, u in batches]
+                 for bt, batches in model.get_inventory().items()}
+
+def get_forecast(body):
+    return 200, model.predict_demand(model.get_demand_model())
+
+def get_donor(body, donor_id):
+    rows = model.execute("SELECT donor_id, name, blood_type, last_donation FROM donors "
+                         "WHERE donor_id=?", (donor_id,))
+    if not rows:
+        raise KeyError(f"Unknown donor {donor_id}")
+    donor = dict(zip(("donor_id", "name", "blood_type", "last_donation"), rows[0]))
+    if donor["last_donation"] is not None:
+        donor["last_donation"] = model.from_day(donor["last_donation"]).isoformat()
+    return 200, donor
+
+def get_recipient(body, recipient_id):
+    rows = model.execute("SELECT recipient_id, name, blood_type, required_units, request_date "
+                         "FROM recipients WHERE recipient_id=?", (recipient_id,))
+    if not rows:
+        raise KeyError(f"Unknown recipient {recipient_id}")
+    recipient = dict(zip(("recipient_id", "name", "blood_type", "required_units",
+                          "request_date"), rows[0]))
+    recipient["request_date"] = model.from_day(recipient["request_date"]).isoformat()
+    return 200, recipient
+
+def post_donor(body):
+    donor_id, name = _field(body, "donor_id"), _field(body, "name")
+    bt = _field(body, "blood_type").strip().upper()
+    if bt not in model.COMPATIBILITY:
+        raise ValueError(f"unknown blood type '{bt}'")
+    model.add_donor(donor_id, name, bt)
+    return 201, {"donor_id": donor_id}
+
+def post_donation(body):
+    donor_id, units = _field(body, "donor_id"), _units(body, "units")
+    donation_date = body.get("donation_date") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        donation_date = model.from_day(model.to_day(str(donation_date))).isoformat()
+    except ValueError:
+        raise ValueError("field 'donation_date' must be a YYYY-MM-DD date") from None
+    model.record_donation(donor_id, units, donation_date)
+    model.JOURNAL.record("donation", f"Donation: {units} units from {donor_id} on {donation_date}",
+                         donor_id=donor_id, units=units, donation_date=donation_date,
+                         source="service")
+    return 201, {"donor_id": donor_id, "units": units, "donation_date": donation_date}
+
+def post_recipient(body):
+    recipient_id, name = _field(body, "recipient_id"), _field(body, "name")
+    bt = _field(body, "blood_type").strip().upper()
+    if bt not in model.COMPATIBILITY:
+        raise ValueError(f"unknown blood type '{bt}'")
+    model.add_recipient(recipient_id, name, bt, _units(body, "required_units"))
+    return 201, {"recipient_id": recipient_id}
+
+def post_transfusion(body):
+    recipient_id = _field(body, "recipient_id")
+    name, needed, bt, batches = model.process_transfusion(recipient_id)
+    if bt is None:
+        return 409, {"error": f"Insufficient compatible blood for {name}."}
+    model.JOURNAL.record("transfusion", f"Transfusion processed for {recipient_id}",
+                         recipient_id=recipient_id, blood_type=bt, units=needed,
+                         source="service")
+    return 200, {"recipient_id": recipient_id, "blood_type": bt, "units": needed,
+                 "batches": [{"donation_date": d.strftime("%Y-%m-%d"), "units": u}
+                             for d, u in batches]}
+
+# (method, path pattern, handler, is_write)
+ROUTES = [
+    ("GET", r"/stock", get_stock, False),
+    ("GET", r"/inventory", get_inventory, False),
+    ("GET", r"/forecast", get_forecast, False),
+    ("GET", r"/donors/([^/]+)", get_donor, False),
+    ("GET", r"/recipients/([^/]+)", get_recipient, False),
+    ("POST", r"/donors", post_donor, True),
+    ("POST", r"/donations", post_donation, True),
+    ("POST", r"/recipients", post_recipient, True),
+    ("POST", r"/transfusions", post_transfusion, True),
+]
+ROUTES = [(m, re.compile(p + r"/?"), h, w) for m, p, h, w in ROUTES]
+
+# -------------------------------------------------
+# Server
+# -------------------------------------------------
+class BloodService:
+    def __init__(self, readers=4, queue_size=1024):
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="reader")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self.writes = asyncio.Queue(maxsize=queue_size)
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            handler, args, fut = await self.writes.get()
+            try:
+                result = await loop.run_in_executor(self.writer, handler, *args)
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+
+    async def submit_write(self, handler, *args):
+        fut = asyncio.get_running_loop().create_future()
+        await self.writes.put((handler, args, fut))
+        return await fut
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                units = await self.submit_write(model.sweep_expired)
+                if units:
+                    print(f"Expiry sweep: {units} units moved to waste", flush=True)
+            except Exception as exc:
+                print(f"Expiry sweep failed: {exc}", flush=True)
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def dispatch(self, method, path, raw_body):
+        path = path.split("?", 1)[0]
+        allowed = False
+        for m, pattern, handler, is_write in ROUTES:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            if m != method:
+                allowed = True
+                continue
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+                args = (body,) + match.groups()
+                if is_write:
+                    return await self.submit_write(handler, *args)
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.readers, handler, *args)
+            except KeyError as exc:
+                return 404, {"error": exc.args[0] if exc.args else "not found"}
+            except (ValueError, TypeError) as exc:
+                return 400, {"error": str(exc)}
+            except (sqlite3.IntegrityError, model.AlreadyFulfilledError) as exc:
+                return 409, {"error": str(exc)}
+            except Exception as exc:
+                return 500, {"error": f"{type(exc).__name__}: {exc}"}
+        if allowed:
+            return 405, {"error": f"{method} not allowed on {path}"}
+        return 404, {"error": f"no route for {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = h.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                status, payload = await self.dispatch(method.upper(), target, body)
+                data = json.dumps(payload).encode()
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                              "Content-Type: application/json\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                              "\r\n").encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        # schema setup on the writer thread, which owns the write connection
+        await asyncio.get_running_loop().run_in_executor(self.writer, model.init_db)
+        writer_task = asyncio.create_task(self._write_loop())
+        sweep_task = asyncio.create_task(self._sweep_loop())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Blood bank service on http://{host}:{port} (db: {model.DB_NAME})", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweep_task.cancel()
+            writer_task.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless blood bank JSON service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=model.DB_NAME)
+    parser.add_argument("--readers", type=int, default=4,
+                        help="threads serving read requests concurrently")
+    args = parser.parse_args(argv)
+    model.DB_NAME = args.db
+    try:
+        asyncio.run(BloodService(readers=args.readers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# forecasting.py – daily demand models and a rolling-origin backtest
+#
+#   python forecasting.py                           # backtest every model on blood_bank.db
+#   python forecasting.py --db site.db --horizon 30 --origins 12 --step 7
+#
+# Every model forecasts daily units per blood type from the demand_daily
+# rollup. The series of all types form one (types x days) matrix and each
+# model is fitted to all of them at once with NumPy; the smoothing models
+# also search their parameter grid jointly, one array axis per grid point,
+# and keep the best parameters per type by one-step-ahead squared error.
+# Setting model.FORECAST_MODEL to one of MODELS makes the dashboard use it.
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+import model
+
+ALPHAS = np.array([0.02, 0.05, 0.1, 0.2, 0.3, 0.5])     # level smoothing grid
+GAMMAS = np.array([0.0, 0.05, 0.1, 0.2, 0.3])           # weekday smoothing grid
+
+def weekday(days):
+    """Monday=0 weekday of day numbers (1970-01-01 was a Thursday)."""
+    return (np.asarray(days) + 3) % 7
+
+def daily_demand(today=None, days=None):
+    """Return (types, start_day, Y): Y[i, t] is units requested for types[i] on start_day + t.
+
+    The matrix runs up to *today* inclusive, over the last *days* days (default:
+    back to the first request); days without requests are zero."""
+    end = model.to_day(today or date.today())
+    types = model.BLOOD_TYPES
+    code_of = {bt: i for i, bt in enumerate(types)}
+    first = model.execute("SELECT MIN(day) FROM demand_daily")[0][0]
+    start = end - days + 1 if days else min(first if first is not None else end, end)
+    Y = np.zeros((len(types), end - start + 1))
+    for bt, day, units in model.execute(
+            "SELECT blood_type, day, units FROM demand_daily WHERE day BETWEEN ? AND ?",
+            (start, end)):
+        i = code_of.get(bt)
+        if i is not None:
+            Y[i, day - start] = units
+    return types, start, Y
+
+# -------------------------------------------------
+# Models: fit(Y, start_day) -> state, forecast(state, h) -> (types, h) array
+# -------------------------------------------------
+def _fit_moving_average(Y, start, window=28):
+    return {"level": Y[:, -window:].mean(axis=1)}
+
+def _forecast_moving_average(state, h):
+    return np.repeat(state["level"][:, None], h, axis=1)
+
+def _fit_trend(Y, start, window=90):
+    """Least-squares line through the last *window* days of every type."""
+    y = Y[:, -window:]
+    t = np.arange(y.shape[1], dtype=np.float64)
+    tc = t - t.mean()
+    den = (tc * tc).sum()
+    slope = (y * tc).sum(axis=1) / den if den else np.zeros(len(y))
+    # intercept at the last observed day
+    return {"level": y.mean(axis=1) + slope * tc[-1], "slope": slope}
+
+def _forecast_trend(state, h):
+    steps = np.arange(1, h + 1, dtype=np.float64)
+    return np.maximum(0.0, state["level"][:, None] + np.outer(state["slope"], steps))
+
+def _fit_weekday_mean(Y, start, weeks=8):
+    """Mean units for each weekday over the last *weeks* weeks."""
+    n = min(Y.shape[1], weeks * 7)
+    days = start + Y.shape[1] - n + np.arange(n)
+    wd = weekday(days)
+    profile = np.zeros((len(Y), 7))
+    counts = np.bincount(wd, minlength=7)
+    for w in range(7):
+        if counts[w]:
+            profile[:, w] = Y[:, -n:][:, wd == w].mean(axis=1)
+    return {"profile": profile, "end": start + Y.shape[1]}
+
+def _forecast_weekday_mean(state, h):
+    return state["profile"][:, weekday(state["end"] + np.arange(h))]
+
+def _fit_ses(Y, start):
+    """Simple exponential smoothing; alpha picked per type from ALPHAS."""
+    a = ALPHAS[:, None]                         # (grid, 1) against (grid, types)
+    level = np.repeat(Y[None, :, 0], len(ALPHAS), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(1, Y.shape[1]):
+        err = Y[:, t] - level
+        sse += err * err
+        level += a * err
+    best = sse.argmin(axis=0)
+    cols = np.arange(len(Y))
+    return {"level": level[best, cols], "alpha": ALPHAS[best]}
+
+_forecast_ses = _forecast_moving_average
+
+def _fit_holt_winters(Y, start):
+    """Additive level + weekday seasonality (no trend), (alpha, gamma) per type."""
+    grid_a, grid_g = (g.ravel()[:, None] for g in np.meshgrid(ALPHAS, GAMMAS, indexing="ij"))
+    m, k, T = len(grid_a), len(Y), Y.shape[1]
+    first = Y[:, :min(T, 7)]
+    level = np.repeat(first.mean(axis=1)[None, :], m, axis=0)          # (m, k)
+    season = np.zeros((m, k, 7))
+    wd = weekday(start + np.arange(T))
+    if T >= 7:
+        season[:, :, wd[:7]] = (first - first.mean(axis=1, keepdims=True))[None]
+    sse = np.zeros((m, k))
+    for t in range(T):
+        w = wd[t]
+        err = Y[:, t] - (level + season[:, :, w])
+        if t >= 7:
+            sse += err * err
+        level += grid_a * err
+        season[:, :, w] += grid_g * (1 - grid_a) * err
+    best = sse.argmin(axis=0)
+    cols = np.arange(k)
+    return {"level": level[best, cols], "season": season[best, cols],
+            "alpha": grid_a[best, 0], "gamma": grid_g[best, 0], "end": start + T}
+
+def _forecast_holt_winters(state, h):
+    wd = weekday(state["end"] + np.arange(h))
+    return np.maximum(0.0, state["level"][:, None] + state["season"][:, wd])
+
+MODELS = {
+    "moving_average": (_fit_moving_average, _forecast_moving_average),
+    "trend": (_fit_trend, _forecast_trend),
+    "weekday_mean": (_fit_weekday_mean, _forecast_weekday_mean),
+    "ses": (_fit_ses, _forecast_ses),
+    "holt_winters": (_fit_holt_winters, _forecast_holt_winters),
+}
+
+def fit(name, Y, start):
+    return MODELS[name][0](Y, start)
+
+def forecast(name, state, h):
+    """Daily forecasts for the *h* days after the fitted data, shape (types, h)."""
+    return MODELS[name][1](state, h)
+
+# -------------------------------------------------
+# model.py integration (FORECAST_MODEL)
+# -------------------------------------------------
+def train(name, today=None):
+    """Fit *name* on the whole history; returns a picklable model dict for model.py."""
+    today = today or date.today()
+    types, start, Y = daily_demand(today)
+    return {"kind": name, "ref_day": today.toordinal(), "types": list(types),
+            "state": fit(name, Y, start)}
+
+def predict_horizons(models, horizons):
+    """Total units expected over the next h days for every h in *horizons*.
+
+    Returns an array of shape (len(horizons), len(models["types"])); a
+    cached model skips the days that have passed since it was trained."""
+    elapsed = max(0, date.today().toordinal() - models["ref_day"])
+    horizons = np.asarray(horizons, dtype=np.int64)
+    daily = forecast(models["kind"], models["state"], elapsed + int(horizons.max(initial=0)))
+    cum = np.concatenate([np.zeros((len(daily), 1)), daily.cumsum(axis=1)], axis=1)
+    return (cum[:, elapsed + horizons] - cum[:, [elapsed]]).T
+
+# -------------------------------------------------
+# Rolling-origin backtest
+# -------------------------------------------------
+def backtest(Y, start, names=None, horizon=30, origins=8, step=7, min_train=56):
+    """Refit every model at several forecast origins and score the next *horizon* days.
+
+    Origins are the last *origins* cut points spaced *step* days apart that
+    leave *horizon* days to score and at least *min_train* days to fit.
+    Returns one dict per model: daily MAE and RMSE, MAE of the horizon
+    total per type, and mean fit time."""
+    T = Y.shape[1]
+    cuts = [T - horizon - step * i for i in range(origins)]
+    cuts = sorted(c for c in cuts if c >= min_train)
+    if not cuts:
+        raise ValueError(f"need at least {min_train + horizon} days of history, have {T}")
+    results = []
+    for name in names or MODELS:
+        errors, total_errors, seconds = [], [], 0.0
+        for cut in cuts:
+            t0 = time.perf_counter()
+            state = fit(name, Y[:, :cut], start)
+            seconds += time.perf_counter() - t0
+            pred = forecast(name, state, horizon)
+            actual = Y[:, cut:cut + horizon]
+            errors.append(pred - actual)
+            total_errors.append(pred.sum(axis=1) - actual.sum(axis=1))
+        err = np.concatenate(errors, axis=1)
+        results.append({"model": name, "origins": len(cuts),
+                        "mae": float(np.abs(err).mean()),
+                        "rmse": float(np.sqrt((err * err).mean())),
+                        "total_mae": float(np.abs(np.concatenate(total_errors)).mean()),
+                        "fit_ms": seconds / len(cuts) * 1000})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the demand forecasting models")
+    parser.add_argument("--db", default=model.DB_NAME)
+    parser.add_argument("--horizon", type=int, default=model.FORECAST_DAYS)
+    parser.add_argument("--origins", type=int, default=8)
+    parser.add_argument("--step", type=int, default=7)
+    parser.add_argument("--min-train", type=int, default=56)
+    parser.add_argument("--models", nargs="*", choices=list(MODELS))
+    args = parser.parse_args(argv)
+
+    model.DB_NAME = args.db
+    model.init_db()
+    types, start, Y = daily_demand()
+    print(f"{Y.shape[1]} days x {len(types)} types of history, "
+          f"horizon {args.horizon} d, step {args.step} d")
+    results = backtest(Y, start, args.models, args.horizon, args.origins, args.step,
+                       args.min_train)
+    print(f"{'model':<16} {'origins':>7} {'MAE/day':>9} {'RMSE/day':>9} "
+          f"{'MAE total':>10} {'fit ms':>8}")
+    for r in sorted(results, key=lambda r: r["mae"]):
+        print(f"{r['model']:<16} {r['origins']:>7} {r['mae']:>9.3f} {r['rmse']:>9.3f} "
+              f"{r['total_mae']:>10.2f} {r['fit_ms']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# migration_report.py – query plans and timings before/after init_db() migrates
+#
+#   python migration_report.py blood_bank.db            # works on a scratch copy
+#   python migration_report.py blood_bank.db --in-place # then migrates the file too
+#
+# The database is copied with the SQLite backup API, the main queries are
+# explained and timed on the copy as it is, the copy is migrated with
+# model.init_db(), and the same queries are explained and timed again.
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+import model
+
+def main_queries(day_numbers):
+    """(label, sql, params) for the hot queries, with dates in the schema's format."""
+    today = date.today()
+    if day_numbers:
+        fmt = model.to_day
+    else:
+        fmt = date.isoformat
+    recent, eligible, cutoff = (fmt(today - timedelta(days=n)) for n in (90, 56, 41))
+    return [
+        ("demand history (all)",
+         "SELECT blood_type, required_units, request_date FROM recipients", ()),
+        ("demand history (daily rollup)",
+         "SELECT blood_type, day, units, requests FROM demand_daily", ()),
+        ("demand for one type since date",
+         "SELECT required_units, request_date FROM recipients "
+         "WHERE blood_type=? AND request_date >= ?", ("A+", recent)),
+        ("eligible donors of one type",
+         "SELECT donor_id FROM donors WHERE blood_type=? AND last_donation <= ? "
+         "ORDER BY last_donation", ("B-", eligible)),
+        ("FIFO candidates for allocation",
+         "SELECT blood_type, donation_date, units FROM inventory "
+         "WHERE blood_type IN (?,?,?,?) AND donation_date >= ? "
+         "ORDER BY blood_type, donation_date", ("O-", "O+", "A-", "A+", cutoff)),
+        ("expired batches",
+         "SELECT blood_type, donation_date, units FROM inventory WHERE donation_date < ?",
+         (cutoff,)),
+    ]
+
+def report(path, repeat):
+    conn = sqlite3.connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    print(f"  schema version {version}")
+    for label, sql, params in main_queries(day_numbers=version >= 2):
+        try:
+            plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            start = time.perf_counter()
+            for _ in range(repeat):
+                rows = conn.execute(sql, params).fetchall()
+            ms = (time.perf_counter() - start) / repeat * 1000
+        except sqlite3.Error as exc:
+            print(f"  {label:<34} error: {exc}")
+            continue
+        print(f"  {label:<34} {ms:9.3f} ms  {len(rows):>8} rows")
+        for step in plan:
+            print(f"      {step}")
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Before/after report for the schema migration")
+    parser.add_argument("db", nargs="?", default=model.DB_NAME)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--in-place", action="store_true",
+                        help="also migrate the given database file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="blood-migration-")
+    copy = os.path.join(scratch, "copy.db")
+    src, dst = sqlite3.connect(args.db), sqlite3.connect(copy)
+    src.backup(dst)
+    src.close()
+    dst.close()
+    try:
+        print(f"Before migration ({args.db}):")
+        report(copy, args.repeat)
+        model.DB_NAME = copy
+        start = time.perf_counter()
+        model.init_db()
+        print(f"\nMigration to version {model.SCHEMA_VERSION} took "
+              f"{time.perf_counter() - start:.2f} s")
+        model.close_connections()
+        print("\nAfter migration:")
+        report(copy, args.repeat)
+        if args.in_place:
+            model.DB_NAME = args.db
+            model.init_db()
+            model.close_connections()
+            print(f"\n{args.db} migrated in place.")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
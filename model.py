@@ -1,19 +1,26 @@
 # blood_management_with_model.py
+import os
+import pickle
+import queue
+import random
 import sqlite3
-from datetime import datetime, timedelta
-from collections import defaultdict
+import sys
+import threading
+import atexit
+import bisect
+import functools
+import json
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from collections import defaultdict, deque
+from operator import itemgetter
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle, Image, Spacer, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from sklearn.linear_model import LinearRegression
-import numpy as np
+# pandas, numpy, matplotlib and reportlab are imported inside the functions
+# that need them, so the window appears before any of them has loaded
+# (startup_check.py guards this).
 
 # -------------------------------------------------
 # Configuration
@@ -22,42 +29,708 @@ DB_NAME = "blood_bank.db"
 PDF_TITLE = "Blood Bank Stock & Forecast Report"
 THRESHOLDS = {"high": 10, "medium": 5}
 FORECAST_DAYS = 30          # how many days ahead the model predicts
-MODEL_PATH = "demand_model.pkl"   # not persisted – rebuilt each run
+FORECAST_MODEL = "regression"   # per-request trend; or a forecasting.MODELS name (30-day totals)
+MODEL_PATH = "demand_model.pkl"   # trained model cache, see get_demand_model()
+SHELF_LIFE_DAYS = {"whole_blood": 35, "red_cells": 42, "platelets": 5, "plasma": 365}
+PRODUCT = "red_cells"       # product kept in the inventory table
+EXPIRY_WARNING_DAYS = 7     # dashboard lists units expiring within this window
+DONATION_INTERVAL_DAYS = 56 # minimum gap between whole-blood donations
+SEARCH_CANDIDATES = 500    # donor-name matches ranked per search, see search_donors()
+REPORT_TABLE_ROWS = 41      # inventory rows per Table flowable: one A4 page, so tables rarely split
+REPORT_ROW_HEIGHT = 16      # fixed row height (points), spares platypus measuring each cell
+QUERY_STATS = os.environ.get("BLOOD_QUERY_STATS") == "1"   # opt-in, see enable_query_stats()
+SLOW_QUERY_MS = 50.0        # statements slower than this are written to SLOW_QUERY_LOG
+SLOW_QUERY_LOG = "slow_queries.log"
+BUSY_RETRIES = 8            # write transactions retried this often when the database stays locked
+BUSY_BACKOFF = 0.01         # first retry delay in seconds, doubled per retry
+JOURNAL_PATH = "activity_journal.jsonl"   # append-only activity log, see ActivityJournal
+JOURNAL_MAX_BYTES = 5 * 1024 * 1024       # rotate to .1, .2, ... beyond this size
+JOURNAL_BACKUPS = 5
+JOURNAL_FLUSH_MS = 200      # group-commit window: entries recorded within it share one fsync
+LOG_LINES = 500             # entries kept in memory and in the on-screen log
 
 # -------------------------------------------------
 # Database layer
 # -------------------------------------------------
+# Every thread keeps one long-lived connection per database file, opened in
+# autocommit mode; multi-statement work is grouped with transaction().
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+_pool = {}                 # (thread id, db path) -> sqlite3.Connection
+_pool_lock = threading.Lock()
+
+def get_connection():
+    """Return the calling thread's connection to DB_NAME, opening it on first use."""
+    key = (threading.get_ident(), DB_NAME)
+    conn = _pool.get(key)
+    if conn is None:
+        start = time.perf_counter()
+        # DB_NAME may be a URI, e.g. 'file:site.db?mode=ro' for read-only use
+        conn = sqlite3.connect(DB_NAME, isolation_level=None,
+                               check_same_thread=False, uri=DB_NAME.startswith("file:"))
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with _pool_lock:
+            _pool[key] = conn
+        if _stats is not None:
+            _stats.record_connect(time.perf_counter() - start)
+    return conn
+
+def close_connections():
+    """Close every pooled connection (called automatically at exit)."""
+    with _pool_lock:
+        conns = list(_pool.values())
+        _pool.clear()
+    for conn in conns:
+        conn.close()
+
+atexit.register(close_connections)
+
+@contextmanager
+def transaction(mode="DEFERRED"):
+    """Group statements into one transaction on this thread's connection.
+
+    *mode* is DEFERRED, IMMEDIATE or EXCLUSIVE. A nested scope joins the
+    enclosing transaction; the outermost scope commits, or rolls back if the
+    block raises."""
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:     # SQLite may already have rolled back
+            conn.execute("ROLLBACK")
+        raise
+
+_busy_lock = threading.Lock()
+busy_retries = 0            # retries taken by retry_on_busy() in this process
+
+def retry_on_busy(func):
+    """Re-run *func* with jittered exponential backoff while SQLite reports the
+    database locked, up to BUSY_RETRIES times.
+
+    Only an outermost call retries: inside an open transaction the error is
+    re-raised so that the enclosing scope rolls back and can retry as a whole.
+    busy_timeout already waits inside SQLite; this covers waits beyond it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global busy_retries
+        delay = BUSY_BACKOFF
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as exc:
+                busy = "locked" in str(exc) or "busy" in str(exc)
+                if not busy or attempt == BUSY_RETRIES or get_connection().in_transaction:
+                    raise
+            with _busy_lock:
+                busy_retries += 1
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 1.0)
+    return wrapper
+
+# Dates are stored as integer day numbers: days since 1970-01-01.
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAY_TO_TEXT_SQL = "date({0} * 86400, 'unixepoch')"          # day number -> 'YYYY-MM-DD'
+TEXT_TO_DAY_SQL = "text_to_day({0})"      # Python to_day(), registered by the migration
+DATE_FORMAT = "%Y-%m-%d"    # what the forms have always accepted, '2024-1-5' included
+
+def to_day(value):
+    """Convert a date, datetime or DATE_FORMAT string to a day number.
+
+    A time after the date ('2024-01-05 10:30', '2024-01-05T10:30') is ignored;
+    anything else raises ValueError."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        text = value.strip().partition(" ")[0].partition("T")[0]
+        value = datetime.strptime(text, DATE_FORMAT)
+    return value.toordinal() - _EPOCH_ORDINAL
+
+def from_day(day):
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+def today_day():
+    return to_day(date.today())
+
+# Schema migrations, applied in order by init_db(). PRAGMA user_version holds
+# the number of steps a database has been through.
+def _rebuild_table(name, columns, select):
+    execute(f"CREATE TABLE {name}_new ({columns})")
+    execute(f"INSERT INTO {name}_new SELECT {select} FROM {name}")
+    execute(f"DROP TABLE {name}")
+    execute(f"ALTER TABLE {name}_new RENAME TO {name}")
+
+def _migrate_text_schema():
+    """1: the original text-dated tables; adds the missing recipients.request_date."""
+    tables = {name for name, in execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if "recipients" in tables and "transfusions" not in tables:
+        # written before transfusions were recorded: whether these requests
+        # were served is unknown, so step 6 must not queue them again
+        execute("CREATE TABLE served_before_transfusions AS SELECT recipient_id FROM recipients")
+    execute("""CREATE TABLE IF NOT EXISTS donors (
+                   donor_id TEXT PRIMARY KEY,
+                   name TEXT NOT NULL,
+                   blood_type TEXT NOT NULL,
+                   last_donation TEXT)""")
+    execute("""CREATE TABLE IF NOT EXISTS recipients (
+                   recipient_id TEXT PRIMARY KEY,
+                   name TEXT NOT NULL,
+                   blood_type TEXT NOT NULL,
+                   required_units INTEGER NOT NULL,
+                   request_date TEXT NOT NULL)""")
+    execute("""CREATE TABLE IF NOT EXISTS inventory (
+                   blood_type TEXT,
+                   donation_date TEXT,
+                   units INTEGER,
+                   PRIMARY KEY (blood_type, donation_date))""")
+    execute("""CREATE TABLE IF NOT EXISTS waste (
+                   blood_type TEXT NOT NULL,
+                   donation_date TEXT NOT NULL,
+                   units INTEGER NOT NULL,
+                   discarded_date TEXT NOT NULL)""")
+    execute("""CREATE TABLE IF NOT EXISTS transfusions (
+                   recipient_id TEXT NOT NULL,
+                   blood_type TEXT NOT NULL,
+                   donation_date TEXT NOT NULL,
+                   units INTEGER NOT NULL,
+                   transfusion_date TEXT NOT NULL)""")
+    # bumped by every inventory change, from this process or any other
+    execute("""CREATE TABLE IF NOT EXISTS inventory_meta (
+                   id INTEGER PRIMARY KEY CHECK (id = 0),
+                   version INTEGER NOT NULL)""")
+    execute("INSERT OR IGNORE INTO inventory_meta VALUES (0, 0)")
+    # databases created before request_date existed
+    if "request_date" not in [row[1] for row in execute("PRAGMA table_info(recipients)")]:
+        execute("ALTER TABLE recipients ADD COLUMN request_date TEXT")
+        execute("UPDATE recipients SET request_date=? WHERE request_date IS NULL",
+                (date.today().isoformat(),))
+
+def _text_to_day(value):
+    return None if value is None else to_day(value)
+
+def _migrate_day_numbers():
+    """2: integer day numbers for every date column, plus secondary indexes.
+
+    Dates are parsed in Python with to_day(), the format the forms validated
+    with; any value it cannot read aborts the migration before a table is
+    rebuilt, so no date is ever turned into NULL."""
+    bad = []
+    for table, column in (("donors", "last_donation"), ("recipients", "request_date"),
+                          ("inventory", "donation_date"), ("waste", "donation_date"),
+                          ("waste", "discarded_date"), ("transfusions", "donation_date"),
+                          ("transfusions", "transfusion_date")):
+        for value, in execute(f"SELECT DISTINCT {column} FROM {table} "
+                              f"WHERE {column} IS NOT NULL"):
+            try:
+                to_day(value)
+            except (TypeError, ValueError):
+                bad.append(f"{table}.{column} = {value!r}")
+    if bad:
+        raise ValueError(f"{DB_NAME}: cannot convert {len(bad)} date value(s) to day "
+                         "numbers, fix them and restart: " + ", ".join(bad[:10]))
+    get_connection().create_function("text_to_day", 1, _text_to_day, deterministic=True)
+    day = TEXT_TO_DAY_SQL.format
+    _rebuild_table("donors", """donor_id TEXT PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                blood_type TEXT NOT NULL,
+                                last_donation INTEGER""",
+                   f"donor_id, name, blood_type, {day('last_donation')}")
+    _rebuild_table("recipients", """recipient_id TEXT PRIMARY KEY,
+                                    name TEXT NOT NULL,
+                                    blood_type TEXT NOT NULL,
+                                    required_units INTEGER NOT NULL,
+                                    request_date INTEGER NOT NULL""",
+                   f"recipient_id, name, blood_type, required_units, "
+                   f"COALESCE({day('request_date')}, {today_day()})")
+    _rebuild_table("inventory", """blood_type TEXT,
+                                   donation_date INTEGER,
+                                   units INTEGER,
+                                   PRIMARY KEY (blood_type, donation_date)""",
+                   f"blood_type, {day('donation_date')}, units")
+    _rebuild_table("waste", """blood_type TEXT NOT NULL,
+                               donation_date INTEGER NOT NULL,
+                               units INTEGER NOT NULL,
+                               discarded_date INTEGER NOT NULL""",
+                   f"blood_type, {day('donation_date')}, units, {day('discarded_date')}")
+    _rebuild_table("transfusions", """recipient_id TEXT NOT NULL,
+                                      blood_type TEXT NOT NULL,
+                                      donation_date INTEGER NOT NULL,
+                                      units INTEGER NOT NULL,
+                                      transfusion_date INTEGER NOT NULL""",
+                   f"recipient_id, blood_type, {day('donation_date')}, units, "
+                   f"{day('transfusion_date')}")
+    execute("""CREATE INDEX idx_recipients_type_date
+               ON recipients (blood_type, request_date)""")
+    execute("""CREATE INDEX idx_donors_type_last_donation
+               ON donors (blood_type, last_donation)""")
+    execute("CREATE INDEX idx_inventory_donation_date ON inventory (donation_date)")
+    execute("CREATE INDEX idx_transfusions_recipient ON transfusions (recipient_id)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        execute(f"""CREATE TRIGGER inventory_{event.lower()}_version
+                    AFTER {event} ON inventory
+                    BEGIN UPDATE inventory_meta SET version = version + 1; END""")
+    # every cached inventory view is stale now that the date format changed
+    execute("UPDATE inventory_meta SET version = version + 1")
+
+def _migrate_stock_summary():
+    """3: per-type stock totals kept exact by triggers on inventory."""
+    execute("""CREATE TABLE stock_summary (
+                   blood_type TEXT PRIMARY KEY,
+                   units INTEGER NOT NULL,
+                   oldest_date INTEGER,
+                   batch_count INTEGER NOT NULL)""")
+    execute("""INSERT INTO stock_summary
+               SELECT blood_type, SUM(units), MIN(donation_date), COUNT(*)
+               FROM inventory GROUP BY blood_type""")
+    # the oldest date is re-read from the inventory primary key, a single
+    # index seek, whenever a batch leaves or moves
+    add = """INSERT INTO stock_summary VALUES (NEW.blood_type, NEW.units, NEW.donation_date, 1)
+             ON CONFLICT (blood_type) DO UPDATE SET
+                 units = units + excluded.units,
+                 batch_count = batch_count + 1,
+                 oldest_date = MIN(COALESCE(oldest_date, excluded.oldest_date),
+                                   excluded.oldest_date);"""
+    remove = """UPDATE stock_summary SET units = units - OLD.units,
+                                     batch_count = batch_count - 1
+                WHERE blood_type = OLD.blood_type;"""
+    oldest = """UPDATE stock_summary SET oldest_date =
+                    (SELECT MIN(donation_date) FROM inventory
+                     WHERE inventory.blood_type = stock_summary.blood_type)
+                WHERE blood_type IN ({});"""
+    execute(f"""CREATE TRIGGER stock_summary_insert AFTER INSERT ON inventory
+                BEGIN {add} END""")
+    execute(f"""CREATE TRIGGER stock_summary_delete AFTER DELETE ON inventory
+                BEGIN {remove} {oldest.format("OLD.blood_type")} END""")
+    execute("""CREATE TRIGGER stock_summary_update_units AFTER UPDATE OF units ON inventory
+               WHEN OLD.blood_type = NEW.blood_type AND OLD.donation_date = NEW.donation_date
+               BEGIN UPDATE stock_summary SET units = units + NEW.units - OLD.units
+                     WHERE blood_type = NEW.blood_type; END""")
+    execute(f"""CREATE TRIGGER stock_summary_update_key AFTER UPDATE ON inventory
+                WHEN OLD.blood_type IS NOT NEW.blood_type
+                  OR OLD.donation_date IS NOT NEW.donation_date
+                BEGIN {remove} {add} {oldest.format("OLD.blood_type, NEW.blood_type")} END""")
+
+def _create_donor_names(key):
+    """The donor_names FTS5 index over donors, keyed on donors.<key>, and its triggers."""
+    execute(f"""CREATE VIRTUAL TABLE donor_names USING fts5(
+                    name, content='donors', content_rowid='{key}',
+                    tokenize='unicode61 remove_diacritics 2')""")
+    execute("INSERT INTO donor_names (donor_names) VALUES ('rebuild')")
+    add = f"INSERT INTO donor_names (rowid, name) VALUES (NEW.{key}, NEW.name);"
+    remove = f"""INSERT INTO donor_names (donor_names, rowid, name)
+                 VALUES ('delete', OLD.{key}, OLD.name);"""
+    execute(f"CREATE TRIGGER donor_names_insert AFTER INSERT ON donors BEGIN {add} END")
+    execute(f"CREATE TRIGGER donor_names_delete AFTER DELETE ON donors BEGIN {remove} END")
+    execute(f"""CREATE TRIGGER donor_names_update AFTER UPDATE OF name ON donors
+                BEGIN {remove} {add} END""")
+
+def _migrate_donor_names():
+    """4: FTS5 index over donor names, kept in step by triggers on donors."""
+    try:
+        _create_donor_names("rowid")
+    except sqlite3.OperationalError:
+        return      # SQLite built without FTS5: search_donors() falls back to LIKE
+
+def _migrate_demand_daily():
+    """5: per (blood_type, day) request totals kept by triggers on recipients."""
+    execute("""CREATE TABLE demand_daily (
+                   blood_type TEXT NOT NULL,
+                   day INTEGER NOT NULL,
+                   requests INTEGER NOT NULL,
+                   units INTEGER NOT NULL,
+                   PRIMARY KEY (blood_type, day)) WITHOUT ROWID""")
+    execute("""INSERT INTO demand_daily
+               SELECT blood_type, request_date, COUNT(*), SUM(required_units)
+               FROM recipients GROUP BY blood_type, request_date""")
+    add = """INSERT INTO demand_daily VALUES (NEW.blood_type, NEW.request_date, 1, NEW.required_units)
+             ON CONFLICT (blood_type, day) DO UPDATE SET
+                 requests = requests + 1, units = units + excluded.units;"""
+    remove = """UPDATE demand_daily SET requests = requests - 1, units = units - OLD.required_units
+                WHERE blood_type = OLD.blood_type AND day = OLD.request_date;
+                DELETE FROM demand_daily
+                WHERE blood_type = OLD.blood_type AND day = OLD.request_date AND requests = 0;"""
+    execute(f"CREATE TRIGGER demand_daily_insert AFTER INSERT ON recipients BEGIN {add} END")
+    execute(f"CREATE TRIGGER demand_daily_delete AFTER DELETE ON recipients BEGIN {remove} END")
+    execute(f"""CREATE TRIGGER demand_daily_update
+                AFTER UPDATE OF blood_type, request_date, required_units ON recipients
+                BEGIN {remove} {add} END""")
+
+def _migrate_request_status():
+    """6: recipients.fulfilled, set once a request has been issued stock."""
+    execute("ALTER TABLE recipients ADD COLUMN fulfilled INTEGER NOT NULL DEFAULT 0")
+    execute("""UPDATE recipients SET fulfilled = 1
+               WHERE recipient_id IN (SELECT recipient_id FROM transfusions)""")
+    if execute("SELECT 1 FROM sqlite_master WHERE name='served_before_transfusions'"):
+        execute("""UPDATE recipients SET fulfilled = 1
+                   WHERE recipient_id IN (SELECT recipient_id FROM served_before_transfusions)""")
+        execute("DROP TABLE served_before_transfusions")
+    execute("""CREATE INDEX idx_recipients_pending ON recipients (request_date)
+               WHERE fulfilled = 0""")
+
+def _create_donor_days_triggers():
+    """Triggers keeping donor_days in step with inserts, deletes and updates on donors."""
+    add = """INSERT INTO donor_days VALUES (NEW.blood_type, COALESCE(NEW.last_donation, -1), 1)
+             ON CONFLICT (blood_type, day) DO UPDATE SET donors = donors + 1;"""
+    remove = """UPDATE donor_days SET donors = donors - 1
+                WHERE blood_type = OLD.blood_type AND day = COALESCE(OLD.last_donation, -1);
+                DELETE FROM donor_days
+                WHERE blood_type = OLD.blood_type AND day = COALESCE(OLD.last_donation, -1)
+                  AND donors = 0;"""
+    execute(f"CREATE TRIGGER donor_days_insert AFTER INSERT ON donors BEGIN {add} END")
+    execute(f"CREATE TRIGGER donor_days_delete AFTER DELETE ON donors BEGIN {remove} END")
+    execute(f"""CREATE TRIGGER donor_days_update AFTER UPDATE OF blood_type, last_donation ON donors
+                WHEN OLD.blood_type IS NOT NEW.blood_type
+                  OR OLD.last_donation IS NOT NEW.last_donation
+                BEGIN {remove} {add} END""")
+
+def _migrate_donor_days():
+    """7: donors per (blood_type, last_donation) kept by triggers on donors.
+
+    Donors who never gave are counted under day -1, before any real day."""
+    execute("""CREATE TABLE donor_days (
+                   blood_type TEXT NOT NULL,
+                   day INTEGER NOT NULL,
+                   donors INTEGER NOT NULL,
+                   PRIMARY KEY (blood_type, day)) WITHOUT ROWID""")
+    execute("""INSERT INTO donor_days
+               SELECT blood_type, COALESCE(last_donation, -1), COUNT(*)
+               FROM donors GROUP BY 1, 2""")
+    _create_donor_days_triggers()
+
+def _migrate_demand_version():
+    """8: demand_meta.version, bumped by every change to demand_daily.
+
+    *token* is random per database, so a different database file at the
+    same path never matches a demand model cached for this one."""
+    execute("""CREATE TABLE demand_meta (
+                   id INTEGER PRIMARY KEY CHECK (id = 0),
+                   token TEXT NOT NULL,
+                   version INTEGER NOT NULL)""")
+    execute("INSERT INTO demand_meta VALUES (0, lower(hex(randomblob(8))), 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        execute(f"""CREATE TRIGGER demand_daily_{event.lower()}_version
+                    AFTER {event} ON demand_daily
+                    BEGIN UPDATE demand_meta SET version = version + 1; END""")
+
+def _migrate_donor_key():
+    """9: donors.id INTEGER PRIMARY KEY, the key of the donor_names index.
+
+    An external-content FTS table refers to rows by rowid, and VACUUM may
+    renumber the implicit rowid of a table without an INTEGER PRIMARY KEY;
+    an alias column is never renumbered. Existing rowids are kept."""
+    fts = bool(execute("SELECT 1 FROM sqlite_master WHERE name='donor_names'"))
+    if fts:
+        execute("DROP TABLE donor_names")
+    # dropping the old table drops its index and triggers, recreated below
+    _rebuild_table("donors", """donor_id TEXT UNIQUE,
+                                name TEXT NOT NULL,
+                                blood_type TEXT NOT NULL,
+                                last_donation INTEGER,
+                                id INTEGER PRIMARY KEY""",
+                   "donor_id, name, blood_type, last_donation, rowid")
+    execute("""CREATE INDEX idx_donors_type_last_donation
+               ON donors (blood_type, last_donation)""")
+    _create_donor_days_triggers()
+    if fts:
+        _create_donor_names("id")
+
+MIGRATIONS = [_migrate_text_schema, _migrate_day_numbers, _migrate_stock_summary,
+              _migrate_donor_names, _migrate_demand_daily, _migrate_request_status,
+              _migrate_donor_days, _migrate_demand_version, _migrate_donor_key]
+SCHEMA_VERSION = len(MIGRATIONS)
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS donors (
-                       donor_id TEXT PRIMARY KEY,
-                       name TEXT NOT NULL,
-                       blood_type TEXT NOT NULL,
-                       last_donation TEXT)""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS recipients (
-                       recipient_id TEXT PRIMARY KEY,
-                       name TEXT NOT NULL,
-                       blood_type TEXT NOT NULL,
-                       required_units INTEGER NOT NULL,
-                       request_date TEXT NOT NULL)""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS inventory (
-                       blood_type TEXT,
-                       donation_date TEXT,
-                       units INTEGER,
-                       PRIMARY KEY (blood_type, donation_date))""")
-    conn.commit()
-    conn.close()
+    """Create the schema, or bring an existing database up to SCHEMA_VERSION in place.
+
+    Pending migrations run in one IMMEDIATE transaction together with the
+    user_version bump, so other connections see either the old schema or the
+    new one and a failed step leaves the database untouched."""
+    with transaction("IMMEDIATE"):
+        version = execute("PRAGMA user_version")[0][0]
+        for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step()
+            execute(f"PRAGMA user_version = {target}")
+
+# -------------------------------------------------
+# Query instrumentation (off unless enabled)
+# -------------------------------------------------
+class QueryStats:
+    """Per-statement counters for execute(), executemany() and iter_chunks().
+
+    Statements are keyed by their whitespace-normalised SQL. Latency
+    percentiles come from the last QueryStats.SAMPLES calls of each
+    statement, so memory stays bounded in a long-running process."""
+
+    SAMPLES = 1000
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG):
+        self._lock = threading.Lock()
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self.started = time.time()
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self._keys = {}           # raw SQL -> normalised SQL
+        self._statements = {}     # normalised SQL -> [calls, seconds, rows, samples]
+
+    def record(self, sql, seconds, rows):
+        key = self._keys.get(sql)
+        if key is None:
+            key = self._keys[sql] = " ".join(sql.split())
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = [0, 0.0, 0, deque(maxlen=self.SAMPLES)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += max(rows, 0)
+            entry[3].append(seconds)
+        if seconds * 1000 >= self.slow_ms and self.slow_log:
+            try:
+                with open(self.slow_log, "a", encoding="utf-8") as fh:
+                    fh.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {seconds * 1000:9.1f} ms "
+                             f"{max(rows, 0):>8} rows  {key}\n")
+            except OSError:
+                pass
+
+    def record_connect(self, seconds):
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+
+    def summary(self):
+        """Return one dict per statement, slowest total time first."""
+        with self._lock:
+            items = [(sql, calls, seconds, rows, sorted(samples))
+                     for sql, (calls, seconds, rows, samples) in self._statements.items()]
+        out = []
+        for sql, calls, seconds, rows, samples in items:
+            out.append({"sql": sql, "calls": calls, "total_ms": seconds * 1000,
+                        "mean_ms": seconds / calls * 1000,
+                        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                        "rows": rows})
+        out.sort(key=itemgetter("total_ms"), reverse=True)
+        return out
+
+    def report(self, limit=20):
+        """Return the summary as text, one line per statement."""
+        rows = self.summary()
+        lines = [f"Query statistics over {time.time() - self.started:.0f} s: "
+                 f"{sum(r['calls'] for r in rows)} calls, {len(rows)} statements, "
+                 f"{self.connects} connections opened in {self.connect_seconds * 1000:.1f} ms",
+                 f"{'calls':>8} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'rows':>9}  statement"]
+        for r in rows[:limit]:
+            sql = r["sql"] if len(r["sql"]) <= 90 else r["sql"][:87] + "..."
+            lines.append(f"{r['calls']:>8} {r['total_ms']:>10.1f} {r['mean_ms']:>9.3f} "
+                         f"{r['p95_ms']:>9.3f} {r['rows']:>9}  {sql}")
+        return "\n".join(lines)
+
+_stats = None               # the active QueryStats, or None when disabled
+_report_registered = False
+
+def enable_query_stats(slow_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG, report_at_exit=True):
+    """Start recording query statistics; returns the QueryStats collector."""
+    global _stats, _report_registered
+    if _stats is None:
+        _stats = QueryStats(slow_ms, slow_log)
+    if report_at_exit and not _report_registered:
+        atexit.register(_report_query_stats)
+        _report_registered = True
+    return _stats
+
+def disable_query_stats():
+    """Stop recording; returns the collector that was active (or None)."""
+    global _stats
+    stats, _stats = _stats, None
+    return stats
+
+def query_stats():
+    return _stats
+
+def _report_query_stats():
+    if _stats is not None:
+        sys.stderr.write(_stats.report() + "\n")
 
 def execute(query, params=()):
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute(query, params)
-    conn.commit()
-    rows = cur.fetchall()
-    conn.close()
+    """Run one statement on the pooled connection and return all rows."""
+    if _stats is None:
+        return get_connection().execute(query, params).fetchall()
+    start = time.perf_counter()
+    rows = get_connection().execute(query, params).fetchall()
+    _stats.record(query, time.perf_counter() - start, len(rows))
     return rows
 
+def executemany(query, seq_of_params):
+    """Run one statement for every parameter tuple in *seq_of_params*."""
+    if _stats is None:
+        get_connection().executemany(query, seq_of_params)
+        return
+    start = time.perf_counter()
+    cur = get_connection().executemany(query, seq_of_params)
+    _stats.record(query, time.perf_counter() - start, cur.rowcount)
+
+def iter_chunks(query, params=(), size=5000):
+    """Yield the result of *query* as lists of at most *size* rows.
+
+    With statistics enabled only the time spent in SQLite is counted, not
+    the time the caller spends between chunks."""
+    stats = _stats
+    start = time.perf_counter()
+    cur = get_connection().execute(query, params)
+    seconds = time.perf_counter() - start
+    n = 0
+    try:
+        while True:
+            if stats is None:
+                rows = cur.fetchmany(size)
+            else:
+                start = time.perf_counter()
+                rows = cur.fetchmany(size)
+                seconds += time.perf_counter() - start
+                n += len(rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cur.close()
+        if stats is not None:
+            stats.record(query, seconds, n)
+
+if QUERY_STATS:
+    enable_query_stats()
+
+def stock_levels():
+    """Return dict blood_type -> units in stock, from the 8-row stock_summary."""
+    return dict(execute("SELECT blood_type, units FROM stock_summary WHERE batch_count > 0"))
+
+def stock_summary():
+    """Return [(blood_type, units, oldest_date, batch_count)] for types with stock."""
+    return [(bt, u, from_day(oldest), n) for bt, u, oldest, n in execute(
+        """SELECT blood_type, units, oldest_date, batch_count FROM stock_summary
+           WHERE batch_count > 0 ORDER BY blood_type""")]
+
+# -------------------------------------------------
+# In-memory inventory index
+# -------------------------------------------------
+def _inventory_version():
+    return execute("SELECT version FROM inventory_meta")[0][0]
+
+class InventoryIndex:
+    """Process-wide, date-ordered view of the inventory table.
+
+    Each blood type holds two parallel arrays (donation day number, units)
+    plus a running total, so stock questions are O(1) per type. The index is
+    loaded once and then patched in place by the write paths; ``version``
+    follows the database's inventory_meta counter, so a write committed by
+    another process is noticed on the next read and triggers a reload."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._db = None
+        self.version = None
+        self._days = {}
+        self._units = {}
+        self._totals = {}
+
+    def _load(self):
+        with transaction():
+            version = _inventory_version()
+            rows = execute("""SELECT blood_type, donation_date, units FROM inventory
+                              ORDER BY blood_type, donation_date""")
+        days, units, totals = {}, {}, {}
+        for bt, d, u in rows:
+            if bt not in days:
+                days[bt], units[bt], totals[bt] = array("l"), array("l"), 0
+            days[bt].append(d)
+            units[bt].append(u)
+            totals[bt] += u
+        self._days, self._units, self._totals = days, units, totals
+        self._db, self.version = DB_NAME, version
+
+    def sync(self):
+        """Reload if the database changed behind the index's back."""
+        with self._lock:
+            if self._db != DB_NAME or self.version != _inventory_version():
+                self._load()
+
+    def apply(self, deltas, before, after):
+        """Mirror a committed write of (blood_type, day, delta) rows.
+
+        *before*/*after* are the inventory versions read inside the writing
+        transaction; if the index is not exactly at *before* it is reloaded
+        instead of patched."""
+        with self._lock:
+            if self._db != DB_NAME or self.version == after:
+                return
+            if self.version != before:
+                self._load()
+                return
+            for bt, d, delta in deltas:
+                self._add(bt, d, delta)
+            self.version = after
+
+    def _add(self, bt, day, delta):
+        if bt not in self._days:
+            self._days[bt], self._units[bt], self._totals[bt] = array("l"), array("l"), 0
+        days, units = self._days[bt], self._units[bt]
+        i = bisect.bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            units[i] += delta
+            if units[i] == 0:
+                del days[i], units[i]
+        else:
+            days.insert(i, day)
+            units.insert(i, delta)
+        self._totals[bt] += delta
+
+    def stock(self, blood_type):
+        self.sync()
+        return self._totals.get(blood_type, 0)
+
+    def stock_levels(self):
+        """Return dict blood_type -> units currently in stock."""
+        self.sync()
+        with self._lock:
+            return {bt: u for bt, u in self._totals.items() if self._days[bt]}
+
+    def batches(self, blood_type):
+        """Return [(datetime, units), ...] for one type, oldest first."""
+        self.sync()
+        with self._lock:
+            return [(datetime.fromordinal(d + _EPOCH_ORDINAL), u)
+                    for d, u in zip(self._days.get(blood_type, ()),
+                                    self._units.get(blood_type, ()))]
+
+INVENTORY = InventoryIndex()
+
+@contextmanager
+def _inventory_write():
+    """IMMEDIATE transaction whose inventory changes are mirrored into INVENTORY.
+
+    The block appends (blood_type, day, delta_units) tuples to the
+    yielded list; they are applied to the index once the commit succeeds.
+    Use only as the outermost transaction."""
+    deltas = []
+    with transaction("IMMEDIATE"):
+        before = _inventory_version()
+        yield deltas
+        after = _inventory_version()
+    INVENTORY.apply(deltas, before, after)
+
+INVENTORY_UPSERT = """INSERT INTO inventory (blood_type, donation_date, units) VALUES (?,?,?)
+                      ON CONFLICT (blood_type, donation_date)
+                      DO UPDATE SET units = units + excluded.units"""
+
 # -------------------------------------------------
 # Business logic (unchanged)
 # -------------------------------------------------
@@ -71,191 +744,800 @@ COMPATIBILITY = {
     "AB-": ["AB-", "AB+"],
     "AB+": ["AB+"],
 }
+BLOOD_TYPES = list(COMPATIBILITY)      # fixed order for array/index based code
+
 def compatible(donor_bt, recipient_bt):
     return recipient_bt in COMPATIBILITY.get(donor_bt, [])
 
+@retry_on_busy
 def add_donor(donor_id, name, blood_type):
-    execute("INSERT INTO donors VALUES (?,?,?,?)",
-            (donor_id, name, blood_type, None))
+    execute("INSERT INTO donors (donor_id, name, blood_type) VALUES (?,?,?)",
+            (donor_id, name, blood_type))
 
+@retry_on_busy
 def record_donation(donor_id, units, donation_date):
-    donor_bt = execute("SELECT blood_type FROM donors WHERE donor_id=?", (donor_id,))[0][0]
-    execute("""INSERT OR REPLACE INTO inventory (blood_type, donation_date, units)
-               VALUES (?,?,COALESCE((SELECT units FROM inventory WHERE blood_type=? AND donation_date=?),0)+?)""",
-            (donor_bt, donation_date, donor_bt, donation_date, units))
-    execute("UPDATE donors SET last_donation=? WHERE donor_id=?", (donation_date, donor_id))
+    donation_date = to_day(donation_date)
+    with _inventory_write() as deltas:
+        rows = execute("SELECT blood_type FROM donors WHERE donor_id=?", (donor_id,))
+        if not rows:
+            raise KeyError(f"Unknown donor {donor_id}")
+        donor_bt = rows[0][0]
+        deltas.append((donor_bt, donation_date, units))
+        execute(INVENTORY_UPSERT, (donor_bt, donation_date, units))
+        execute("UPDATE donors SET last_donation=? WHERE donor_id=?", (donation_date, donor_id))
 
+@retry_on_busy
 def add_recipient(recipient_id, name, blood_type, required_units):
-    today = datetime.now().strftime("%Y-%m-%d")
-    execute("INSERT INTO recipients VALUES (?,?,?,?,?)",
-            (recipient_id, name, blood_type, required_units, today))
+    execute("""INSERT INTO recipients (recipient_id, name, blood_type, required_units,
+                                      request_date) VALUES (?,?,?,?,?)""",
+            (recipient_id, name, blood_type, required_units, today_day()))
 
 def get_inventory():
-    rows = execute("SELECT blood_type, donation_date, units FROM inventory")
     inv = defaultdict(list)
-    for bt, d, u in rows:
-        inv[bt].append((datetime.strptime(d, "%Y-%m-%d"), u))
-    for bt in inv:
-        inv[bt].sort(key=lambda x: x[0])
+    for bt in INVENTORY.stock_levels():
+        inv[bt] = INVENTORY.batches(bt)
     return inv
 
-def allocate(blood_type, needed):
-    inv = get_inventory()
-    batches = inv.get(blood_type, [])
-    allocated = []
+def _plan_fifo(batches, needed):
+    """Take *needed* units from date-ordered (date, units) batches, oldest first.
+
+    Returns a list of (date, taken, left) or None if the batches fall short."""
+    plan = []
     remaining = needed
-    for i, (date, units) in enumerate(batches):
+    for date, units in batches:
         if remaining <= 0:
             break
         take = min(units, remaining)
-        allocated.append((date, take))
+        plan.append((date, take, units - take))
         remaining -= take
-        new_units = units - take
-        if new_units == 0:
-            execute("DELETE FROM inventory WHERE blood_type=? AND donation_date=?",
-                    (blood_type, date.strftime("%Y-%m-%d")))
-        else:
-            execute("UPDATE inventory SET units=? WHERE blood_type=? AND donation_date=?",
-                    (new_units, blood_type, date.strftime("%Y-%m-%d")))
-    return allocated if remaining == 0 else None
+    return plan if remaining == 0 else None
+
+def _apply_plan(blood_type, plan, recipient_id=None):
+    executemany("DELETE FROM inventory WHERE blood_type=? AND donation_date=?",
+                [(blood_type, d) for d, _, left in plan if left == 0])
+    executemany("UPDATE inventory SET units=? WHERE blood_type=? AND donation_date=?",
+                [(left, blood_type, d) for d, _, left in plan if left])
+    if recipient_id is not None:
+        _record_transfusions([(recipient_id, blood_type, d, take) for d, take, _ in plan])
+
+def _record_transfusions(pieces):
+    today = today_day()
+    executemany("INSERT INTO transfusions VALUES (?,?,?,?,?)",
+                [(rid, bt, d, u, today) for rid, bt, d, u in pieces])
+    executemany("UPDATE recipients SET fulfilled = 1 WHERE recipient_id=?",
+                [(rid,) for rid in {rid for rid, _, _, _ in pieces}])
+
+class AlreadyFulfilledError(Exception):
+    """The recipient's request has already been issued stock."""
+
+@retry_on_busy
+def allocate_from(blood_types, needed, recipient_id=None):
+    """Allocate *needed* units from the first of *blood_types* able to cover them.
+
+    Only the unexpired candidate batches are read, in one query ordered by
+    donation date; the allocation is decided in memory and written in the same
+    IMMEDIATE transaction, so stock is never left half-consumed. With a
+    *recipient_id* the issued batches are recorded in ``transfusions``, and a
+    recipient whose request is already fulfilled raises AlreadyFulfilledError
+    (checked inside the transaction, so a repeated call cannot issue twice).
+    Returns (blood_type, [(date, units), ...]) or None."""
+    marks = ",".join("?" * len(blood_types))
+    with _inventory_write() as deltas:
+        if recipient_id is not None and execute(
+                "SELECT 1 FROM recipients WHERE recipient_id=? AND fulfilled",
+                (recipient_id,)):
+            raise AlreadyFulfilledError(f"Request of {recipient_id} is already fulfilled")
+        rows = execute(f"""SELECT blood_type, donation_date, units FROM inventory
+                           WHERE blood_type IN ({marks}) AND donation_date >= ?
+                           ORDER BY blood_type, donation_date""",
+                       tuple(blood_types) + (expiry_cutoff(),))
+        batches = defaultdict(list)
+        for bt, d, u in rows:
+            batches[bt].append((d, u))
+        for bt in blood_types:
+            plan = _plan_fifo(batches.get(bt, ()), needed)
+            if plan:
+                _apply_plan(bt, plan, recipient_id)
+                deltas.extend((bt, d, -take) for d, take, _ in plan)
+                return bt, [(datetime.fromordinal(d + _EPOCH_ORDINAL), take)
+                            for d, take, _ in plan]
+    return None
+
+def allocate(blood_type, needed):
+    result = allocate_from([blood_type], needed)
+    return result[1] if result else None
 
 def process_transfusion(recipient_id):
-    rec = execute("SELECT name, blood_type, required_units FROM recipients WHERE recipient_id=?",
-                  (recipient_id,))[0]
-    name, r_bt, needed = rec
+    """Allocate compatible stock for a recipient (no UI).
+
+    Returns (name, needed, blood_type_used, batches); the last two are None
+    when compatible stock is short. Raises KeyError for an unknown recipient
+    and AlreadyFulfilledError if the request was served before."""
+    rows = execute("SELECT name, blood_type, required_units FROM recipients WHERE recipient_id=?",
+                   (recipient_id,))
+    if not rows:
+        raise KeyError(f"Unknown recipient {recipient_id}")
+    name, r_bt, needed = rows[0]
     compatible_types = [bt for bt in COMPATIBILITY if r_bt in COMPATIBILITY[bt]]
-    for bt in compatible_types:
-        if allocate(bt, needed):
-            messagebox.showinfo("Success",
-                                f"{needed} units of {bt} allocated to {name}.")
-            return True
-    messagebox.showwarning("Failed",
-                           f"Insufficient compatible blood for {name}.")
-    return False
+    result = allocate_from(compatible_types, needed, recipient_id)
+    if result:
+        return (name, needed) + result
+    return name, needed, None, None
+
+# -------------------------------------------------
+# Donor search
+# -------------------------------------------------
+def eligible_donors(blood_type, min_days=DONATION_INTERVAL_DAYS, today=None, limit=50, offset=0):
+    """Return one page of *blood_type* donors who may donate again.
+
+    Donors who never gave come first, then the longest since their last
+    donation. The query walks idx_donors_type_last_donation in that order
+    and stops after the page. Rows are (donor_id, name, last_donation,
+    days_since); the last two are None for first-time donors."""
+    today = to_day(today or date.today())
+    rows = execute("""SELECT donor_id, name, last_donation FROM donors
+                      WHERE blood_type=? AND (last_donation IS NULL OR last_donation <= ?)
+                      ORDER BY last_donation LIMIT ? OFFSET ?""",
+                   (blood_type, today - min_days, limit, offset))
+    return [(did, name, None, None) if last is None else
+            (did, name, from_day(last), today - last) for did, name, last in rows]
+
+def count_eligible_donors(blood_type, min_days=DONATION_INTERVAL_DAYS, today=None):
+    """Number of donors eligible_donors() would page through.
+
+    Summed from the donor_days rollup, one row per distinct donation day,
+    instead of counting every donor."""
+    today = to_day(today or date.today())
+    return execute("""SELECT COALESCE(SUM(donors), 0) FROM donor_days
+                      WHERE blood_type=? AND day <= ?""",
+                   (blood_type, today - min_days))[0][0]
+
+_donor_fts = {}             # DB_NAME -> whether the donor_names FTS5 index exists
+
+def search_donors(text, limit=20):
+    """Find donors whose name contains every word of *text* as a word prefix.
+
+    Uses the donor_names FTS5 index: names holding every word whole come
+    first, then the page is filled from the prefix matches. Each query ranks
+    at most SEARCH_CANDIDATES rows, so broad prefixes stay interactive on
+    large tables; on SQLite builds without FTS5 it falls back to a LIKE scan.
+    Rows are (donor_id, name, blood_type, last_donation)."""
+    terms = text.split()
+    if not terms:
+        return []
+    if DB_NAME not in _donor_fts:
+        _donor_fts[DB_NAME] = bool(execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='donor_names'"))
+    if _donor_fts[DB_NAME]:
+        words = [t.casefold() for t in terms]
+
+        def relevance(row):
+            # whole-word hits first, then the shortest (closest) names
+            name_words = row[2].casefold().split()
+            return -sum(w in name_words for w in words), len(row[2]), row[2]
+        # bm25 (ORDER BY rank) needs index-wide statistics for every term and
+        # scores every match before LIMIT, which takes seconds for a common
+        # prefix; instead a bounded set of candidates is ranked here. The
+        # candidates come in id order, so the exact-word query runs first or
+        # a short name could be crowded out by longer ones sharing its prefix
+        rows, seen = [], set()
+        for suffix in ("", "*"):
+            query = " ".join('"{}"{}'.format(t.replace('"', '""'), suffix) for t in terms)
+            found = execute("""SELECT id, donor_id, name, blood_type, last_donation FROM donors
+                               WHERE id IN (SELECT rowid FROM donor_names
+                                            WHERE donor_names MATCH ? LIMIT ?)""",
+                            (query, max(limit, SEARCH_CANDIDATES)))
+            rows += sorted((r for r in found if r[0] not in seen), key=relevance)
+            seen.update(r[0] for r in found)
+            if len(rows) >= limit:
+                break
+        rows = [r[1:] for r in rows[:limit]]
+    else:
+        escaped = [t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                   for t in terms]
+        where = " AND ".join(["name LIKE ? ESCAPE '\\'"] * len(terms))
+        rows = execute(f"""SELECT donor_id, name, blood_type, last_donation FROM donors
+                           WHERE {where} ORDER BY name LIMIT ?""",
+                       tuple(f"%{t}%" for t in escaped) + (limit,))
+    return [(did, name, bt, None if last is None else from_day(last))
+            for did, name, bt, last in rows]
+
+# -------------------------------------------------
+# Expiry
+# -------------------------------------------------
+# A batch is usable while donation_date >= expiry_cutoff(); every query here
+# is a range on idx_inventory_donation_date rather than a table scan.
+def expiry_cutoff(today=None, product=None):
+    """Return the day number of the oldest donation that is still usable."""
+    today = to_day(today or date.today())
+    return today - SHELF_LIFE_DAYS[product or PRODUCT] + 1
+
+@retry_on_busy
+def sweep_expired(today=None):
+    """Move expired batches from inventory to ``waste``; returns the units discarded."""
+    today = to_day(today or date.today())
+    cutoff = expiry_cutoff(today)
+    with _inventory_write() as deltas:
+        rows = execute("""SELECT blood_type, donation_date, units FROM inventory
+                          WHERE donation_date < ?""", (cutoff,))
+        if rows:
+            executemany("INSERT INTO waste VALUES (?,?,?,?)",
+                        [(bt, d, u, today) for bt, d, u in rows])
+            execute("DELETE FROM inventory WHERE donation_date < ?", (cutoff,))
+            deltas.extend((bt, d, -u) for bt, d, u in rows)
+    return sum(u for _, _, u in rows)
+
+def expiring_units(days=EXPIRY_WARNING_DAYS, today=None):
+    """Return dict blood_type -> usable units that expire within *days* days."""
+    today = to_day(today or date.today())
+    first = expiry_cutoff(today)
+    last = expiry_cutoff(today + days)
+    return dict(execute("""SELECT blood_type, SUM(units) FROM inventory
+                           WHERE donation_date >= ? AND donation_date < ?
+                           GROUP BY blood_type""", (first, last)))
+
+# -------------------------------------------------
+# Batch allocation
+# -------------------------------------------------
+# Giving a donor type away costs its universality: the number of recipient
+# types it can serve. Exact matches are therefore always cheapest and O- is
+# only used where nothing rarer will do.
+ISSUE_COST = {bt: len(COMPATIBILITY[bt]) for bt in BLOOD_TYPES}
+
+def pending_requests():
+    """Return [(recipient_id, blood_type, units)] not yet fulfilled, oldest first."""
+    return execute("""SELECT recipient_id, blood_type, required_units FROM recipients
+                      WHERE fulfilled = 0
+                      ORDER BY request_date, rowid""")
+
+def _min_cost_flow(supply, demand):
+    """Move sum(demand) units from donor types to recipient types at least ISSUE_COST.
+
+    *supply*/*demand* are lists aligned with BLOOD_TYPES and must be feasible.
+    Successive shortest paths (Bellman-Ford on the 16-node residual graph);
+    returns flow[d][r]."""
+    k = len(BLOOD_TYPES)
+    inf = float("inf")
+    arcs = [(d, r, ISSUE_COST[BLOOD_TYPES[d]])
+            for d in range(k) for r in range(k)
+            if BLOOD_TYPES[r] in COMPATIBILITY[BLOOD_TYPES[d]]]
+    flow = [[0] * k for _ in range(k)]
+    supply, demand = list(supply), list(demand)
+    while any(demand):
+        dist_d = [0 if supply[d] > 0 else inf for d in range(k)]
+        dist_r = [inf] * k
+        pred_d, pred_r = [None] * k, [None] * k
+        changed = True
+        while changed:
+            changed = False
+            for d, r, c in arcs:
+                if dist_d[d] + c < dist_r[r]:
+                    dist_r[r], pred_r[r], changed = dist_d[d] + c, d, True
+                if flow[d][r] and dist_r[r] - c < dist_d[d]:
+                    dist_d[d], pred_d[d], changed = dist_r[r] - c, r, True
+        reachable = [r for r in range(k) if demand[r] and dist_r[r] < inf]
+        if not reachable:
+            break
+        r = min(reachable, key=dist_r.__getitem__)
+        # walk back to the donor the path starts from; a step may cancel flow
+        # the donor previously sent to another recipient type (*back*)
+        steps, amount, node = [], demand[r], r
+        while True:
+            d = pred_r[node]
+            back = pred_d[d]
+            steps.append((d, node, back))
+            if back is None:
+                amount = min(amount, supply[d])
+                break
+            amount = min(amount, flow[d][back])
+            node = back
+        for d, fwd, back in steps:
+            flow[d][fwd] += amount
+            if back is not None:
+                flow[d][back] -= amount
+        supply[steps[-1][0]] -= amount
+        demand[r] -= amount
+    return flow
+
+def plan_batch_allocation(requests, stock, allow_split=True):
+    """Decide a joint allocation for many requests against current stock.
+
+    *requests* are (recipient_id, blood_type, units) in priority order and
+    *stock* maps blood_type to [(donation_day, units)] oldest first.
+    Requests are admitted in order while the whole set stays satisfiable
+    (Hall's condition over recipient-type subsets), then a min-cost flow
+    decides how many units each donor type gives to each recipient type,
+    preserving rare and universal types. Units are drawn from the oldest
+    batches first. With ``allow_split=False`` every request is served from
+    a single donor type, picked greedily by ISSUE_COST instead.
+    Returns {recipient_id: [(donor_type, donation_day, units), ...]} for the
+    requests that are served in full."""
+    k = len(BLOOD_TYPES)
+    pos = {bt: i for i, bt in enumerate(BLOOD_TYPES)}
+    supply = [sum(u for _, u in stock.get(bt, ())) for bt in BLOOD_TYPES]
+    requests = [(rid, bt, u) for rid, bt, u in requests if bt in pos and u > 0]
+    # donor types each recipient type accepts, cheapest first
+    donors_for = [sorted((d for d in range(k) if BLOOD_TYPES[r] in COMPATIBILITY[BLOOD_TYPES[d]]),
+                         key=lambda d: ISSUE_COST[BLOOD_TYPES[d]])
+                  for r in range(k)]
+
+    pieces = defaultdict(list)      # donor type -> [(recipient_id, units)] in priority order
+    if allow_split:
+        subsets = range(1, 1 << k)
+        cap = {}
+        for s in subsets:
+            mask = 0
+            for r in range(k):
+                if s >> r & 1:
+                    for d in donors_for[r]:
+                        mask |= 1 << d
+            cap[s] = sum(supply[d] for d in range(k) if mask >> d & 1)
+        with_r = [[s for s in subsets if s >> r & 1] for r in range(k)]
+        load = dict.fromkeys(subsets, 0)
+        admitted, demand = [], [0] * k
+        for rid, bt, u in requests:
+            r = pos[bt]
+            if all(load[s] + u <= cap[s] for s in with_r[r]):
+                for s in with_r[r]:
+                    load[s] += u
+                admitted.append((rid, r, u))
+                demand[r] += u
+        flow = _min_cost_flow(supply, demand)
+        for rid, r, u in admitted:
+            for d in donors_for[r]:
+                take = min(u, flow[d][r])
+                if take:
+                    flow[d][r] -= take
+                    pieces[d].append((rid, take))
+                    u -= take
+    else:
+        left = list(supply)
+        for rid, bt, u in requests:
+            for d in donors_for[pos[bt]]:
+                if left[d] >= u:
+                    left[d] -= u
+                    pieces[d].append((rid, u))
+                    break
+
+    plan = defaultdict(list)
+    for d, wanted in pieces.items():
+        batches = iter(stock[BLOOD_TYPES[d]])
+        day, avail = None, 0
+        for rid, u in wanted:
+            while u:
+                if not avail:
+                    day, avail = next(batches)
+                take = min(u, avail)
+                plan[rid].append((BLOOD_TYPES[d], day, take))
+                avail -= take
+                u -= take
+    return dict(plan)
+
+@retry_on_busy
+def allocate_batch(allow_split=True, dry_run=False):
+    """Plan and apply a joint allocation for every pending request.
+
+    Pending requests and the inventory are read and the plan from
+    plan_batch_allocation() is written back in one IMMEDIATE transaction,
+    recording every issued batch in ``transfusions``. Returns
+    (plan, pending_count)."""
+    with _inventory_write() as deltas:
+        requests = pending_requests()
+        stock = defaultdict(list)
+        for bt, d, u in execute("""SELECT blood_type, donation_date, units FROM inventory
+                                   WHERE units > 0 AND donation_date >= ?
+                                   ORDER BY blood_type, donation_date""", (expiry_cutoff(),)):
+            stock[bt].append((d, u))
+        plan = plan_batch_allocation(requests, stock, allow_split)
+        if plan and not dry_run:
+            taken = defaultdict(int)
+            for rows in plan.values():
+                for bt, d, u in rows:
+                    taken[(bt, d)] += u
+            left = {(bt, d): u for bt, batches in stock.items() for d, u in batches}
+            executemany("DELETE FROM inventory WHERE blood_type=? AND donation_date=?",
+                        [key for key, u in taken.items() if left[key] == u])
+            executemany("UPDATE inventory SET units=? WHERE blood_type=? AND donation_date=?",
+                        [(left[key] - u,) + key for key, u in taken.items() if left[key] > u])
+            _record_transfusions([(rid, bt, d, u) for rid, rows in plan.items()
+                                  for bt, d, u in rows])
+            deltas.extend((bt, d, -u) for (bt, d), u in taken.items())
+    return plan, len(requests)
 
 # -------------------------------------------------
 # Excel / PDF handling (same as previous version)
 # -------------------------------------------------
+EXPORT_COLUMNS = ["Blood Type", "Donation Date", "Units"]
+
+def stream_inventory_export(filepath, fmt=None):
+    """Write the inventory table to *filepath* straight from a cursor.
+
+    *fmt* is "xlsx", "csv" or "parquet" (default: the file extension).
+    Rows are fetched in chunks and written as they arrive - an openpyxl
+    write-only workbook, the csv module, or one pyarrow row group per chunk -
+    so memory stays flat whatever the table size. Returns the row count."""
+    fmt = (fmt or filepath.rsplit(".", 1)[-1]).lower()
+    chunks = iter_chunks(f"""SELECT blood_type, {DAY_TO_TEXT_SQL.format("donation_date")}, units
+                             FROM inventory ORDER BY blood_type, donation_date""")
+    n = 0
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Inventory")
+        ws.append(EXPORT_COLUMNS)
+        for rows in chunks:
+            for row in rows:
+                ws.append(row)
+            n += len(rows)
+        wb.save(filepath)
+    elif fmt == "csv":
+        import csv
+        with open(filepath, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in chunks:
+                writer.writerows(rows)
+                n += len(rows)
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs the 'pyarrow' package.") from None
+        schema = pa.schema([("Blood Type", pa.string()),
+                            ("Donation Date", pa.string()),
+                            ("Units", pa.int64())])
+        with pq.ParquetWriter(filepath, schema) as writer:
+            for rows in chunks:
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(col) for col in zip(*rows)], schema=schema))
+                n += len(rows)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return n
+
 def export_inventory_to_excel(filepath):
-    inv = get_inventory()
-    data = []
-    for bt, batches in inv.items():
-        for d, u in batches:
-            data.append({"Blood Type": bt,
-                         "Donation Date": d.strftime("%Y-%m-%d"),
-                         "Units": u})
-    pd.DataFrame(data).to_excel(filepath, index=False)
-    messagebox.showinfo("Exported", f"Inventory saved to {filepath}")
+    n = stream_inventory_export(filepath)
+    messagebox.showinfo("Exported", f"Inventory saved to {filepath} ({n} rows)")
+
+_EXCEL_EPOCH = date(1899, 12, 30)
+
+def _import_day(value):
+    """Day number of an Excel date cell; raises ValueError if it is not a date."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # a date cell stored as a plain number: Excel's serial day count
+        return to_day(_EXCEL_EPOCH + timedelta(days=int(value)))
+    if isinstance(value, (date, str)):
+        try:
+            return to_day(value)
+        except ValueError:
+            pass
+    import pandas as pd
+    try:
+        return to_day(pd.to_datetime(value).date())
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f"not a date: {value!r}") from None
+
+def bulk_import_excel(filepath):
+    """Stream an inventory sheet into the database in one transaction.
+
+    Rows are read with openpyxl in read-only mode, normalised (each distinct
+    date cell is parsed once) and summed per (blood_type, date) before a
+    single executemany upsert. Returns (rows_read, batches_written, seconds)."""
+    from openpyxl import load_workbook
+    start = time.perf_counter()
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows)]
+        i_bt, i_date, i_units = (header.index(col) for col in
+                                 ("Blood Type", "Donation Date", "Units"))
+        totals = defaultdict(int)
+        dates = {}
+        n = 0
+        for line, row in enumerate(rows, start=2):
+            raw_bt, raw_date = row[i_bt], row[i_date]
+            if raw_bt is None or raw_date is None:
+                continue
+            try:
+                d = dates.get(raw_date)
+                if d is None:
+                    d = dates[raw_date] = _import_day(raw_date)
+                totals[(str(raw_bt).strip().upper(), d)] += int(row[i_units])
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Row {line}: {exc}") from None
+            n += 1
+    finally:
+        wb.close()
+    batches = [(bt, d, u) for (bt, d), u in totals.items()]
+    with _inventory_write() as deltas:
+        executemany(INVENTORY_UPSERT, batches)
+        deltas.extend(batches)
+    return n, len(batches), time.perf_counter() - start
 
 def import_excel_to_db(filepath):
-    df = pd.read_excel(filepath, engine="openpyxl")
-    for _, row in df.iterrows():
-        bt = str(row["Blood Type"]).strip().upper()
-        date = pd.to_datetime(row["Donation Date"]).strftime("%Y-%m-%d")
-        units = int(row["Units"])
-        execute("""INSERT OR REPLACE INTO inventory (blood_type, donation_date, units)
-                   VALUES (?,?,COALESCE((SELECT units FROM inventory WHERE blood_type=? AND donation_date=?),0)+?)""",
-                (bt, date, bt, date, units))
-    messagebox.showinfo("Imported", f"Data from {filepath} loaded.")
+    try:
+        n, batches, seconds = bulk_import_excel(filepath)
+    except ValueError as exc:
+        messagebox.showerror("Import failed", f"{filepath}: {exc}. Nothing was imported.")
+        return
+    rate = n / seconds if seconds else n
+    messagebox.showinfo("Imported",
+                        f"Data from {filepath} loaded: {n} rows into {batches} batches "
+                        f"in {seconds:.2f} s ({rate:,.0f} rows/s).")
 
-def generate_pdf_report(filepath):
-    inv = get_inventory()
-    # Table data
-    table_data = [["Blood Type", "Donation Date", "Units"]]
-    for bt, batches in inv.items():
-        for d, u in batches:
-            table_data.append([bt, d.strftime("%Y-%m-%d"), str(u)])
-
-    c = canvas.Canvas(filepath, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    c.setFont("Helvetica-Bold", 20)
-    c.drawString(40, y, PDF_TITLE)
-    y -= 30
-
-    # Table
+class _StreamingStory(list):
+    """Flowable list for ``doc.build()`` that is filled from an iterator on demand.
+
+    platypus only looks at the head of the story, so a short look-ahead means
+    the inventory tables are created page by page instead of all up front."""
+
+    def __init__(self, flowables, lookahead=4):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                list.append(self, next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, key):
+        self._fill()
+        return list.__getitem__(self, key)
+
+def forecast_png(dpi=150):
+    """Return the forecast chart as PNG bytes, rendered without a GUI backend."""
+    import io
+    fig, _ = plot_forecast()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi)
+    return buf.getvalue()
+
+def render_pdf_report(filepath, summary, chart_png, rows, period=None):
+    """Lay out a report from already-read data; returns (rows, pages).
+
+    *summary* is stock_summary() output, *chart_png* the bytes from
+    forecast_png() and *rows* an iterable of (blood_type, 'YYYY-MM-DD', units).
+    Rows are consumed REPORT_TABLE_ROWS at a time into fixed-row-height
+    tables whose header repeats on every page, so build time grows linearly
+    and memory stays flat however large the inventory is."""
+    import io
+    from itertools import islice
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    styles = getSampleStyleSheet()
     style = TableStyle([
         ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
         ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
         ("ALIGN", (0,0), (-1,-1), "CENTER"),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
         ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold")
     ])
-    tbl = Table(table_data, colWidths=[120, 150, 80])
-    tbl.setStyle(style)
-    tbl.wrapOn(c, width, height)
-    tbl.drawOn(c, 40, y - tbl._height)
-    y -= tbl._height + 30
-
-    # Forecast chart (generated later)
-    fig, ax = plot_forecast()
-    chart_path = "temp_forecast.png"
-    fig.savefig(chart_path, bbox_inches="tight")
-    plt.close(fig)
-    c.drawImage(chart_path, 40, y-200, width=500, preserveAspectRatio=True)
-    c.showPage()
-    c.save()
-    messagebox.showinfo("PDF Created", f"Report saved to {filepath}")
+    col_widths = [120, 150, 80]
+
+    def table(data):
+        tbl = Table(data, colWidths=col_widths,
+                    rowHeights=[REPORT_ROW_HEIGHT] * len(data), repeatRows=1)
+        tbl.setStyle(style)
+        return tbl
+
+    def footer(canv, doc):
+        canv.setFont("Helvetica", 8)
+        canv.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2,
+                             f"{PDF_TITLE} - page {doc.page}")
+
+    doc = SimpleDocTemplate(filepath, pagesize=A4, title=PDF_TITLE)
+    rows = iter(rows)
+    count = 0
+
+    def story():
+        nonlocal count
+        yield Paragraph(PDF_TITLE, styles["Title"])
+        subtitle = f"Generated {date.today():%Y-%m-%d}"
+        if period:
+            subtitle += f" - donations {period[0]:%Y-%m-%d} to {period[1]:%Y-%m-%d}"
+        yield Paragraph(subtitle, styles["Normal"])
+        yield Spacer(1, 12)
+        w, h = ImageReader(io.BytesIO(chart_png)).getSize()
+        yield Image(io.BytesIO(chart_png), width=doc.width, height=doc.width * h / w)
+        yield Spacer(1, 12)
+        yield Paragraph("Stock summary", styles["Heading2"])
+        yield table([["Blood Type", "Units", "Oldest Batch"]] +
+                    [[bt, str(u), oldest.strftime("%Y-%m-%d")] for bt, u, oldest, _ in summary])
+        yield Spacer(1, 12)
+        yield Paragraph("Inventory", styles["Heading2"])
+        while True:
+            chunk = list(islice(rows, REPORT_TABLE_ROWS))
+            if not chunk:
+                break
+            count += len(chunk)
+            yield table([EXPORT_COLUMNS] + [[bt, d, str(u)] for bt, d, u in chunk])
+        if not count:
+            yield Paragraph("No units in stock.", styles["Normal"])
+
+    doc.build(_StreamingStory(story()), onFirstPage=footer, onLaterPages=footer)
+    return count, doc.page
+
+def build_pdf_report(filepath, period=None):
+    """Write the stock & forecast report to *filepath*; returns (rows, pages).
+
+    With *period* = (start, end), inclusive, the inventory section lists only
+    batches donated in that range. Rows are streamed from a cursor."""
+    where, params = "", ()
+    if period is not None:
+        period = tuple(from_day(to_day(d)) for d in period)
+        where, params = "WHERE donation_date BETWEEN ? AND ?", tuple(map(to_day, period))
+    chunks = iter_chunks(f"""SELECT blood_type, {DAY_TO_TEXT_SQL.format("donation_date")}, units
+                             FROM inventory {where} ORDER BY blood_type, donation_date""",
+                         params, size=REPORT_TABLE_ROWS)
+    return render_pdf_report(filepath, stock_summary(), forecast_png(),
+                             (row for chunk in chunks for row in chunk), period)
+
+def generate_pdf_report(filepath):
+    rows, pages = build_pdf_report(filepath)
+    messagebox.showinfo("PDF Created",
+                        f"Report saved to {filepath} ({rows} batches, {pages} pages)")
 
 # -------------------------------------------------
 # Demand‑forecast model
 # -------------------------------------------------
-def _historical_demand():
-    """Return a DataFrame with columns: blood_type, day_offset, units_requested."""
-    rows = execute("SELECT blood_type, required_units, request_date FROM recipients")
-    data = []
-    today = datetime.now()
-    for bt, units, date_str in rows:
-        day_offset = (today - datetime.strptime(date_str, "%Y-%m-%d")).days
-        data.append({"blood_type": bt, "day_offset": day_offset, "units": units})
-    return pd.DataFrame(data)
+def _historical_demand(today=None):
+    """Return NumPy arrays (type_code, day_offset, units, requests), one entry per
+    (blood_type, day) of the demand_daily rollup.
+
+    type_code indexes BLOOD_TYPES; days for unknown types are dropped."""
+    import numpy as np
+    rows = execute("SELECT blood_type, day, units, requests FROM demand_daily")
+    bts, days, units, requests = (list(map(itemgetter(i), rows)) for i in range(4))
+    code_of = {bt: i for i, bt in enumerate(BLOOD_TYPES)}
+    codes = np.fromiter((code_of.get(bt, -1) for bt in bts), dtype=np.int64, count=len(rows))
+    offsets = to_day(today or date.today()) - np.array(days, dtype=np.float64)
+    units = np.array(units, dtype=np.float64)
+    requests = np.array(requests, dtype=np.float64)
+    known = codes >= 0
+    return codes[known], offsets[known], units[known], requests[known]
 
 def train_demand_model():
-    """Train a separate linear regression for each blood type."""
-    df = _historical_demand()
-    models = {}
-    for bt in df["blood_type"].unique():
-        sub = df[df["blood_type"] == bt]
-        X = sub[["day_offset"]].values
-        y = sub["units"].values
-        if len(X) < 2:   # not enough data – fallback to mean
-            pred = np.mean(y) if len(y) > 0 else 0
-            models[bt] = lambda _: pred
-            continue
-        reg = LinearRegression()
-        reg.fit(X, y)
-        models[bt] = lambda days, r=reg: max(0, r.predict([[days]])[0])
-    return models
+    """Fit every blood type's linear demand trend in one grouped least-squares pass.
+
+    The fit is over individual requests, but the sufficient statistics
+    (n, Σx, Σy, Σx², Σxy) are weighted sums over the daily rollup, so its
+    cost follows days of history rather than request count. Types with a
+    single request or a single distinct day fall back to their mean.
+    Returns a plain, picklable dict: ``intercept``/``slope`` arrays aligned
+    with ``types``, over day_offset counted in days before ``ref_day``."""
+    import numpy as np
+    today = date.today()
+    codes, x, y, w = _historical_demand(today)
+    k = len(BLOOD_TYPES)
+    n = np.bincount(codes, w, minlength=k)
+    sx = np.bincount(codes, w * x, minlength=k)
+    sy = np.bincount(codes, y, minlength=k)
+    sxx = np.bincount(codes, w * x * x, minlength=k)
+    sxy = np.bincount(codes, x * y, minlength=k)
+    den = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(den > 0, (n * sxy - sx * sy) / den, 0.0)
+        intercept = np.where(n > 0, (sy - slope * sx) / n, 0.0)
+    present = n > 0
+    return {"ref_day": today.toordinal(),
+            "types": [bt for bt, p in zip(BLOOD_TYPES, present) if p],
+            "intercept": intercept[present],
+            "slope": slope[present]}
+
+def predict_horizons(models, horizons):
+    """Predict every type for every horizon at once.
+
+    Returns an array of shape (len(horizons), len(models["types"]))."""
+    import numpy as np
+    if models.get("kind", "regression") != "regression":
+        import forecasting
+        return forecasting.predict_horizons(models, horizons)
+    # x counts days before ref_day, so e days after training a horizon h sits
+    # at x = h - e, which is where a fresh fit today would evaluate it
+    x = np.asarray(horizons, dtype=np.float64) - (date.today().toordinal() - models["ref_day"])
+    return np.maximum(0.0, models["intercept"] + np.outer(x, models["slope"]))
 
 def predict_demand(models, days_ahead=FORECAST_DAYS):
     """Return dict blood_type → predicted units for the next *days_ahead* days."""
-    preds = {}
-    for bt, func in models.items():
-        preds[bt] = func(days_ahead)
-    return preds
+    return dict(zip(models["types"], predict_horizons(models, [days_ahead])[0].tolist()))
 
-def plot_forecast():
-    """Create a Matplotlib figure that shows current stock + forecast."""
-    inv = get_inventory()
-    current = {bt: sum(u for _, u in batches) for bt, batches in inv.items()}
-    models = train_demand_model()
-    forecast = predict_demand(models)
+# trained model kept in memory and in MODEL_PATH, keyed by _demand_fingerprint()
+_MODEL_FORMAT = 2           # bump when the layout of the trained model changes
+_demand_cache = {}
+_demand_lock = threading.Lock()
+
+def _demand_fingerprint():
+    # every write to demand_daily bumps demand_meta.version in the same transaction
+    return (_MODEL_FORMAT, FORECAST_MODEL) + tuple(execute(
+        "SELECT token, version FROM demand_meta")[0])
+
+def _load_demand_model():
+    try:
+        with open(MODEL_PATH, "rb") as fh:
+            return pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+
+def _save_demand_model(cached):
+    tmp = f"{MODEL_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(cached, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, MODEL_PATH)
+
+def _train_forecast_model():
+    if FORECAST_MODEL == "regression":
+        return train_demand_model()
+    import forecasting
+    return forecasting.train(FORECAST_MODEL)
 
+def get_demand_model():
+    """Return the demand model, retraining only when the recipients data changed.
+
+    The fingerprint (model format, FORECAST_MODEL, database token and
+    demand_meta.version) is a single-row read; on a match the in-memory
+    model is reused, then the copy persisted in MODEL_PATH, and only
+    otherwise is it refitted."""
+    fingerprint = _demand_fingerprint()
+    with _demand_lock:
+        if _demand_cache.get("fingerprint") != fingerprint:
+            cached = _load_demand_model()
+            if not isinstance(cached, dict) or cached.get("fingerprint") != fingerprint:
+                cached = dict(_train_forecast_model(), fingerprint=fingerprint)
+                try:
+                    _save_demand_model(cached)
+                except OSError:
+                    pass    # read-only directory: keep the in-memory copy
+            _demand_cache.clear()
+            _demand_cache.update(cached)
+        return dict(_demand_cache)
+
+def forecast_data():
+    """Return (blood_types, stock_vals, forecast_vals) for the stock/forecast chart.
+
+    Touches only the database and caches, so it is safe to call off the Tk thread."""
+    current = stock_levels()
+    forecast = predict_demand(get_demand_model())
     blood = sorted(set(current) | set(forecast))
     stock_vals = [current.get(bt, 0) for bt in blood]
     forecast_vals = [forecast.get(bt, 0) for bt in blood]
+    return blood, stock_vals, forecast_vals
 
-    fig, ax = plt.subplots(figsize=(8, 4))
+def _draw_forecast(ax, blood, stock_vals, forecast_vals):
+    """Draw the chart on *ax*; returns the (stock, forecast) bar containers."""
+    import numpy as np
     x = np.arange(len(blood))
     width = 0.35
-    ax.bar(x - width/2, stock_vals, width, label="Current Stock",
-           color=[_bar_colour(v) for v in stock_vals])
-    ax.bar(x + width/2, forecast_vals, width, label=f"Forecast ({FORECAST_DAYS} d)",
-           color="#2196f3")
+    stock_bars = ax.bar(x - width/2, stock_vals, width, label="Current Stock",
+                        color=[_bar_colour(v) for v in stock_vals])
+    forecast_bars = ax.bar(x + width/2, forecast_vals, width,
+                           label=f"Forecast ({FORECAST_DAYS} d)", color="#2196f3")
     ax.set_xticks(x)
     ax.set_xticklabels(blood)
     ax.set_ylabel("Units")
     ax.set_title("Stock vs. 30‑Day Demand Forecast")
     ax.legend()
+    return stock_bars, forecast_bars
+
+def plot_forecast():
+    """Create a Matplotlib figure that shows current stock + forecast.
+
+    The figure is not registered with pyplot, so it is freed as soon as the
+    caller drops it."""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 4))
+    ax = fig.add_subplot(111)
+    _draw_forecast(ax, *forecast_data())
     return fig, ax
 
 def _bar_colour(units):
@@ -266,10 +1548,154 @@ def _bar_colour(units):
     else:
         return "#f44336"
 
+# -------------------------------------------------
+# Activity journal
+# -------------------------------------------------
+class ActivityJournal:
+    """Append-only JSON-lines journal of donations, transfusions and other events.
+
+    record() only queues the entry and appends it to ``recent`` (a ring
+    buffer of the last LOG_LINES entries); a background thread writes
+    whatever has queued up every JOURNAL_FLUSH_MS with a single write and
+    fsync (group commit). The file is rotated to path.1 ... path.N once it
+    would exceed JOURNAL_MAX_BYTES."""
+
+    def __init__(self, path=JOURNAL_PATH, max_bytes=JOURNAL_MAX_BYTES,
+                 backups=JOURNAL_BACKUPS, flush_ms=JOURNAL_FLUSH_MS, ring_size=LOG_LINES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_ms / 1000
+        self.recent = deque(maxlen=ring_size)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._loaded = False
+
+    def record(self, kind, message, **fields):
+        """Queue one entry; returns it as the dict that will be written."""
+        entry = {"ts": datetime.now().isoformat(timespec="milliseconds"),
+                 "kind": kind, "message": message, **fields}
+        with self._cond:
+            self._pending.append(entry)
+            self.recent.append(entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="activity-journal")
+                self._thread.start()
+                atexit.register(self.flush)
+            self._cond.notify()
+        return entry
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.flush_interval)     # let the rest of the group arrive
+            self.flush()
+
+    def flush(self):
+        """Write every queued entry now, in one append + fsync."""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            data = "".join(json.dumps(e, default=str) + "\n" for e in batch).encode("utf-8")
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if size and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def _rotate(self):
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+
+    def files(self):
+        """Journal files oldest first: path.N ... path.1, path."""
+        names = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        return [p for p in names if os.path.exists(p)]
+
+    def entries(self, since=None, until=None, kinds=None, text=None):
+        """Yield written entries oldest first, filtered by time range, kind and text.
+
+        *since*/*until* are datetimes or ISO strings (inclusive); *text*
+        matches the message case-insensitively."""
+        since = since.isoformat() if isinstance(since, datetime) else since
+        until = until.isoformat() if isinstance(until, datetime) else until
+        kinds = {kinds} if isinstance(kinds, str) else kinds
+        text = text.lower() if text else None
+        self.flush()
+        for path in self.files():
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue        # torn last line after a crash
+                    ts = entry.get("ts", "")
+                    if ((since and ts < since) or (until and ts > until)
+                            or (kinds and entry.get("kind") not in kinds)
+                            or (text and text not in entry.get("message", "").lower())):
+                        continue
+                    yield entry
+
+    def load_recent(self):
+        """Fill ``recent`` from the end of the journal (once); returns it."""
+        with self._cond:
+            if self._loaded:
+                return self.recent
+            self._loaded = True
+            queued = list(self.recent)
+        tail = deque(maxlen=self.recent.maxlen)
+        for path in reversed(self.files()):
+            tail.extendleft(reversed(_tail_lines(path, tail.maxlen - len(tail))))
+            if len(tail) == tail.maxlen:
+                break
+        with self._cond:
+            self.recent.clear()
+            for line in tail:
+                try:
+                    self.recent.append(json.loads(line))
+                except ValueError:
+                    pass
+            self.recent.extend(queued)
+        return self.recent
+
+def _tail_lines(path, n, block=64 * 1024):
+    """Return up to the last *n* lines of *path*, reading backwards in blocks."""
+    if n <= 0:
+        return []
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        pos, data = fh.tell(), b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            fh.seek(pos)
+            data = fh.read(step) + data
+    return [line.decode("utf-8", "replace") for line in data.splitlines()[-n:] if line]
+
+JOURNAL = ActivityJournal()
+
 # -------------------------------------------------
 # GUI – integrates forecast chart
 # -------------------------------------------------
 class BloodApp(tk.Tk):
+    REFRESH_DELAY_MS = 300      # saves closer together than this share one recompute
+    POLL_MS = 50
+    SWEEP_INTERVAL_MS = 60 * 60 * 1000
+
     def __init__(self):
         super().__init__()
         self.title("🩸 Blood Management System – Forecast Edition")
@@ -278,7 +1704,8 @@ class BloodApp(tk.Tk):
         self._create_menu()
         self._create_dashboard()
         self._create_log()
-        self.refresh_dashboard()
+        self._start_refresh_worker()
+        self._sweep_expired()
 
     # ----- Menus -----
     def _create_menu(self):
@@ -288,11 +1715,15 @@ class BloodApp(tk.Tk):
         donor = tk.Menu(menubar, tearoff=0)
         donor.add_command(label="Add Donor", command=self.add_donor_dialog)
         donor.add_command(label="Record Donation", command=self.record_donation_dialog)
+        donor.add_separator()
+        donor.add_command(label="Find Donor…", command=self.find_donor_dialog)
+        donor.add_command(label="Eligible Donors…", command=self.eligible_donors_dialog)
         menubar.add_cascade(label="Donors", menu=donor)
 
         rec = tk.Menu(menubar, tearoff=0)
         rec.add_command(label="Add Recipient", command=self.add_recipient_dialog)
         rec.add_command(label="Process Transfusion", command=self.process_transfusion_dialog)
+        rec.add_command(label="Allocate All Pending", command=self.allocate_pending_dialog)
         menubar.add_cascade(label="Recipients", menu=rec)
 
         rep = tk.Menu(menubar, tearoff=0)
@@ -300,26 +1731,118 @@ class BloodApp(tk.Tk):
         rep.add_command(label="Import ← Excel", command=self.import_excel_dialog)
         rep.add_separator()
         rep.add_command(label="Generate PDF Report", command=self.pdf_report_dialog)
+        rep.add_command(label="Stock-out Risk…", command=self.stockout_risk_dialog)
+        rep.add_separator()
+        self._query_stats_on = tk.BooleanVar(value=query_stats() is not None)
+        rep.add_checkbutton(label="Record Query Statistics", variable=self._query_stats_on,
+                            command=self._toggle_query_stats)
+        rep.add_command(label="Show Query Statistics", command=self.query_stats_dialog)
         menubar.add_cascade(label="Reports", menu=rep)
 
     # ----- Dashboard (stock + forecast) -----
     def _create_dashboard(self):
-        dash = ttk.LabelFrame(self, text="Stock & Forecast Dashboard", padding=10)
-        dash.pack(fill="both", expand=True, padx=12, pady=12)
+        self._dash = ttk.LabelFrame(self, text="Stock & Forecast Dashboard", padding=10)
+        self._dash.pack(fill="both", expand=True, padx=12, pady=12)
+        self._expiring = ttk.Label(self._dash, text="")
+        self._expiring.pack(side="bottom", anchor="w")
+        # placeholder until _build_chart() has loaded matplotlib
+        self._chart_placeholder = ttk.Label(self._dash, text="Loading forecast…")
+        self._chart_placeholder.pack(expand=True)
+        self.canvas = None
+        self._pending_chart = None
+        self.after(100, self._build_chart)
 
-        self.fig, self.ax = plt.subplots(figsize=(9, 4))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=dash)
+    def _build_chart(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self._chart_placeholder.destroy()
+        self.fig = Figure(figsize=(9, 4))
+        self.ax = self.fig.add_subplot(111)
+        self._chart_types = None
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self._dash)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        if self._pending_chart is not None:
+            self._draw_dashboard(*self._pending_chart)
+
+    # The stock/forecast numbers are computed on a background thread. Requests
+    # are debounced with after() and any that pile up while the worker is busy
+    # are drained into a single recompute; results come back through a queue
+    # polled from the Tk thread.
+    def _start_refresh_worker(self):
+        self._refresh_after = None
+        self._refresh_requests = queue.Queue()
+        self._refresh_results = queue.Queue()
+        threading.Thread(target=self._refresh_worker, daemon=True,
+                         name="dashboard-refresh").start()
+        self.after(self.POLL_MS, self._poll_refresh)
 
     def refresh_dashboard(self):
-        fig, ax = plot_forecast()
-        self.fig.clf()
-        self.ax = self.fig.add_subplot(111)
-        # copy the generated axes into the displayed figure
-        for artist in fig.axes[0].get_children():
-            artist.remove()
-            self.ax.add_artist(artist)
-        self.canvas.draw()
+        if self._refresh_after is not None:
+            self.after_cancel(self._refresh_after)
+        self._refresh_after = self.after(self.REFRESH_DELAY_MS, self._request_refresh)
+
+    def _request_refresh(self):
+        self._refresh_after = None
+        self._refresh_requests.put(True)
+
+    def _refresh_worker(self):
+        while True:
+            self._refresh_requests.get()
+            while not self._refresh_requests.empty():
+                self._refresh_requests.get_nowait()
+            try:
+                self._refresh_results.put((forecast_data(), expiring_units()))
+            except Exception as exc:
+                self._refresh_results.put(exc)
+
+    def _poll_refresh(self):
+        result = None
+        while not self._refresh_results.empty():
+            result = self._refresh_results.get_nowait()
+        if isinstance(result, Exception):
+            self._log(f"Dashboard refresh failed: {result}")
+        elif result is not None:
+            chart, expiring = result
+            self._show_expiring(expiring)
+            if self.canvas is None:
+                self._pending_chart = chart
+            else:
+                self._draw_dashboard(*chart)
+        self.after(self.POLL_MS, self._poll_refresh)
+
+    def _show_expiring(self, expiring):
+        if expiring:
+            parts = ", ".join(f"{bt}: {u}" for bt, u in sorted(expiring.items()))
+            text = f"Expiring within {EXPIRY_WARNING_DAYS} days – {parts}"
+        else:
+            text = f"No units expire within {EXPIRY_WARNING_DAYS} days."
+        self._expiring.configure(text=text)
+
+    def _sweep_expired(self):
+        units = sweep_expired()
+        if units:
+            self._log(f"Expiry sweep: {units} expired units moved to waste",
+                      "expiry", units=units)
+        self.refresh_dashboard()
+        self.after(self.SWEEP_INTERVAL_MS, self._sweep_expired)
+
+    def _draw_dashboard(self, blood, stock_vals, forecast_vals):
+        # the bars persist between refreshes; they are only rebuilt when the
+        # set of blood types on the chart changes
+        if blood != self._chart_types:
+            self.ax.clear()
+            self._stock_bars, self._forecast_bars = _draw_forecast(
+                self.ax, blood, stock_vals, forecast_vals)
+            self._chart_types = blood
+        else:
+            for bar, v in zip(self._stock_bars, stock_vals):
+                bar.set_height(v)
+                bar.set_color(_bar_colour(v))
+            for bar, v in zip(self._forecast_bars, forecast_vals):
+                bar.set_height(v)
+            self.ax.relim()
+            self.ax.autoscale_view()
+        self.canvas.draw_idle()
 
     # ----- Log -----
     def _create_log(self):
@@ -327,11 +1850,21 @@ class BloodApp(tk.Tk):
         log_frame.pack(fill="x", padx=12, pady=(0,12))
         self.log = tk.Text(log_frame, height=6, state="disabled", bg="#ffffff")
         self.log.pack(fill="x", padx=5, pady=5)
+        # the previous session's tail of the journal, from its ring buffer
+        self._show_log_entries(list(JOURNAL.load_recent()))
+
+    def _log(self, msg, kind="info", **fields):
+        self._show_log_entries([JOURNAL.record(kind, msg, **fields)])
 
-    def _log(self, msg):
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _show_log_entries(self, entries):
+        # the widget keeps at most LOG_LINES lines, like the journal's ring buffer
         self.log.configure(state="normal")
-        self.log.insert("end", f"[{ts}] {msg}\n")
+        for e in entries:
+            ts = e["ts"][:19].replace("T", " ")
+            self.log.insert("end", f"[{ts}] {e['message']}\n")
+        excess = int(self.log.index("end-1c").split(".")[0]) - 1 - LOG_LINES
+        if excess > 0:
+            self.log.delete("1.0", f"{excess + 1}.0")
         self.log.configure(state="disabled")
         self.log.see("end")
 
@@ -361,7 +1894,8 @@ class BloodApp(tk.Tk):
             messagebox.showerror("Error", "All fields required.")
             return
         add_donor(did, name, bt)
-        self._log(f"Added donor {did} – {name} ({bt})")
+        self._log(f"Added donor {did} – {name} ({bt})", "donor",
+                  donor_id=did, blood_type=bt)
         self.refresh_dashboard()
 
     def record_donation_dialog(self):
@@ -376,14 +1910,44 @@ class BloodApp(tk.Tk):
         date = f["date"].get().strip()
         try:
             units = int(units)
-            datetime.strptime(date, "%Y-%m-%d")
-        except Exception:
+            date = from_day(to_day(date)).isoformat()
+        except ValueError:
             messagebox.showerror("Error", "Invalid units or date.")
             return
-        record_donation(did, units, date)
-        self._log(f"Donation: {units} units from {did} on {date}")
+        try:
+            record_donation(did, units, date)
+        except KeyError:
+            messagebox.showerror("Error", f"No donor with ID {did}.")
+            return
+        self._log(f"Donation: {units} units from {did} on {date}", "donation",
+                  donor_id=did, units=units, donation_date=date)
         self.refresh_dashboard()
 
+    def find_donor_dialog(self):
+        text = simpledialog.askstring("Find Donor", "Name:")
+        if not text:
+            return
+        rows = search_donors(text, limit=100)
+        lines = [f"{did:<14} {name:<32} {bt:<4} "
+                 f"{last.isoformat() if last else 'never donated'}"
+                 for did, name, bt, last in rows]
+        self._show_text(f"Donors matching '{text}'",
+                        "\n".join(lines) or "No donor matches that name.")
+
+    def eligible_donors_dialog(self):
+        bt = simpledialog.askstring("Eligible Donors", "Blood type:")
+        if not bt:
+            return
+        bt = bt.strip().upper()
+        total = count_eligible_donors(bt)
+        rows = eligible_donors(bt, limit=200)
+        lines = [f"{total} {bt} donors last gave at least {DONATION_INTERVAL_DAYS} days ago"
+                 + (f" (first {len(rows)} shown)" if total > len(rows) else ""), ""]
+        lines += [f"{did:<14} {name:<32} "
+                  f"{f'{days} days' if days is not None else 'never donated'}"
+                  for did, name, _, days in rows]
+        self._show_text(f"Eligible {bt} donors", "\n".join(lines))
+
     def add_recipient_dialog(self):
         dlg = simpledialog.Dialog(self, title="Add Recipient")
         dlg.body = lambda m: self._simple_form(m,
@@ -402,18 +1966,50 @@ class BloodApp(tk.Tk):
             messagebox.showerror("Error", "Units must be integer.")
             return
         add_recipient(rid, name, bt, units)
-        self._log(f"Added recipient {rid} – {name} ({bt}) needs {units}")
+        self._log(f"Added recipient {rid} – {name} ({bt}) needs {units}", "recipient",
+                  recipient_id=rid, blood_type=bt, required_units=units)
         self.refresh_dashboard()
 
     def process_transfusion_dialog(self):
         rid = simpledialog.askstring("Transfusion", "Recipient ID:")
-        if rid and process_transfusion(rid.strip()):
-            self._log(f"Transfusion processed for {rid}")
+        if not rid:
+            return
+        try:
+            name, needed, bt, _ = process_transfusion(rid.strip())
+        except KeyError:
+            messagebox.showerror("Error", f"No recipient with ID {rid}.")
+            return
+        except AlreadyFulfilledError:
+            messagebox.showwarning("Already served",
+                                   f"The request of {rid} has already been fulfilled.")
+            return
+        if bt is None:
+            messagebox.showwarning("Failed",
+                                   f"Insufficient compatible blood for {name}.")
+            return
+        messagebox.showinfo("Success", f"{needed} units of {bt} allocated to {name}.")
+        self._log(f"Transfusion processed for {rid}", "transfusion",
+                  recipient_id=rid, blood_type=bt, units=needed)
+        self.refresh_dashboard()
+
+    def allocate_pending_dialog(self):
+        if not messagebox.askyesno("Allocate All Pending",
+                                   "Allocate stock to every pending recipient now?"):
+            return
+        plan, pending = allocate_batch()
+        units = sum(u for rows in plan.values() for _, _, u in rows)
+        messagebox.showinfo("Batch Allocation",
+                            f"{len(plan)} of {pending} pending requests served ({units} units).")
+        self._log(f"Batch allocation: {len(plan)}/{pending} requests, {units} units",
+                  "batch_allocation", recipients=sorted(plan), units=units)
+        self.refresh_dashboard()
 
     # ----- Report dialogs -----
     def export_excel_dialog(self):
         path = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                           filetypes=[("Excel files", "*.xlsx")],
+                                           filetypes=[("Excel files", "*.xlsx"),
+                                                      ("CSV files", "*.csv"),
+                                                      ("Parquet files", "*.parquet")],
                                            title="Save inventory as Excel")
         if path:
             export_inventory_to_excel(path)
@@ -425,6 +2021,39 @@ class BloodApp(tk.Tk):
             import_excel_to_db(path)
             self.refresh_dashboard()
 
+    def _toggle_query_stats(self):
+        if self._query_stats_on.get():
+            enable_query_stats()
+            self._log("Query statistics enabled")
+        else:
+            disable_query_stats()
+            self._log("Query statistics disabled")
+
+    def query_stats_dialog(self):
+        stats = query_stats()
+        if stats is None:
+            messagebox.showinfo("Query Statistics",
+                                "Recording is off. Enable it under Reports → "
+                                "Record Query Statistics (or set BLOOD_QUERY_STATS=1).")
+            return
+        self._show_text("Query Statistics", stats.report(), width=130)
+
+    def _show_text(self, title, body, width=90):
+        win = tk.Toplevel(self)
+        win.title(title)
+        text = tk.Text(win, width=width, height=25, font=("Courier", 9), wrap="none")
+        text.insert("end", body)
+        text.configure(state="disabled")
+        text.pack(fill="both", expand=True)
+
+    def stockout_risk_dialog(self):
+        import simulation
+        risk = simulation.stockout_risk()
+        lines = [f"Monte Carlo over the next {FORECAST_DAYS} days (10,000 paths)", "",
+                 f"{'Type':<6}{'P(stock-out)':>14}{'Expected shortfall':>20}"]
+        lines += [f"{bt:<6}{p:>14.1%}{s:>16.1f} units" for bt, (p, s) in risk.items()]
+        self._show_text("Stock-out Risk", "\n".join(lines), width=50)
+
     def pdf_report_dialog(self):
         path = filedialog.asksaveasfilename(defaultextension=".pdf",
                                            filetypes=[("PDF files", "*.pdf")],
@@ -0,0 +1,127 @@
+# service_loadtest.py – load test for blood_service.py
+#
+#   python service_loadtest.py --clients 32 --seconds 10 --write-ratio 0.2
+#   python service_loadtest.py --spawn          # start a service on a scratch DB
+#
+# Each client keeps one HTTP/1.1 keep-alive connection and issues a mix of
+# stock/inventory reads and donation/recipient writes as fast as it can.
+# Reports requests per second and p50/p95/p99 latency per request kind.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BLOOD_TYPES = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+
+async def request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+                  ).encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def setup(host, port, donors):
+    reader, writer = await asyncio.open_connection(host, port)
+    for i in range(donors):
+        await request(reader, writer, "POST", "/donors",
+                      {"donor_id": f"LT-D{i}", "name": f"Load Donor {i}",
+                       "blood_type": BLOOD_TYPES[i % len(BLOOD_TYPES)]})
+    writer.close()
+
+async def client(cid, host, port, deadline, write_ratio, donors, samples, errors):
+    rng = random.Random(cid)
+    reader, writer = await asyncio.open_connection(host, port)
+    n = 0
+    try:
+        while time.perf_counter() < deadline:
+            if rng.random() < write_ratio:
+                if rng.random() < 0.7:
+                    kind, method, path = "donation", "POST", "/donations"
+                    body = {"donor_id": f"LT-D{rng.randrange(donors)}",
+                            "units": rng.randint(1, 3)}
+                else:
+                    kind, method, path = "recipient", "POST", "/recipients"
+                    body = {"recipient_id": f"LT-R{cid}-{n}-{time.time_ns()}",
+                            "name": "Load Recipient", "blood_type": rng.choice(BLOOD_TYPES),
+                            "required_units": rng.randint(1, 4)}
+            else:
+                kind, method, path, body = "read", "GET", rng.choice(["/stock", "/inventory"]), None
+            start = time.perf_counter()
+            status = await request(reader, writer, method, path, body)
+            samples.setdefault(kind, []).append(time.perf_counter() - start)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            n += 1
+    finally:
+        writer.close()
+
+def percentile(sorted_vals, p):
+    return sorted_vals[min(len(sorted_vals) - 1, int(p / 100 * len(sorted_vals)))]
+
+async def run(args):
+    await setup(args.host, args.port, args.donors)
+    samples, errors = {}, {}
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    await asyncio.gather(*(client(i, args.host, args.port, deadline, args.write_ratio,
+                                  args.donors, samples, errors)
+                           for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    total = sum(len(v) for v in samples.values())
+    print(f"{total} requests from {args.clients} clients in {elapsed:.1f} s "
+          f"-> {total / elapsed:,.0f} req/s")
+    every = sorted(x for v in samples.values() for x in v)
+    for kind, vals in sorted(samples.items()) + [("all", every)]:
+        vals = sorted(vals)
+        print(f"  {kind:<10} n={len(vals):<7} p50={percentile(vals, 50) * 1e3:7.2f} ms  "
+              f"p95={percentile(vals, 95) * 1e3:7.2f} ms  p99={percentile(vals, 99) * 1e3:7.2f} ms")
+    if errors:
+        print("  errors:", errors)
+    return 1 if errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for blood_service.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--donors", type=int, default=100)
+    parser.add_argument("--spawn", action="store_true",
+                        help="start blood_service.py on a scratch database")
+    args = parser.parse_args()
+
+    proc = None
+    if args.spawn:
+        db = os.path.join(tempfile.mkdtemp(prefix="blood-loadtest-"), "loadtest.db")
+        proc = subprocess.Popen([sys.executable,
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                              "blood_service.py"),
+                                 "--db", db, "--host", args.host, "--port", str(args.port)],
+                                stdout=subprocess.PIPE, text=True)
+        proc.stdout.readline()      # wait for the "listening" line
+    try:
+        sys.exit(asyncio.run(run(args)))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# simulation.py – Monte Carlo stock-out risk per blood type
+#
+#   python simulation.py                            # 10k paths over FORECAST_DAYS
+#   python simulation.py --paths 50000 --days 14 --db site.db --seed 1
+#
+# Every path and blood type advances together one day at a time as
+# (paths, types) arrays: Poisson donations arrive fresh, Poisson demand is
+# served first from the recipient's own type and then from the other
+# compatible types, least universal first (the ISSUE_COST order used by
+# batch allocation), each type issuing its oldest units first; whatever
+# reaches the end of its shelf life is discarded.
+# Demand rates come from the weekday profile in forecasting.py, donation
+# rates from the donations recorded over the last DONATION_WINDOW days.
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+import model
+
+DONATION_WINDOW = 28        # days of recorded donations behind the donation rate
+
+def donor_preferences():
+    """For each recipient type index, the donor type indices it may draw on, in order."""
+    code = {bt: i for i, bt in enumerate(model.BLOOD_TYPES)}
+    prefs = []
+    for r in model.BLOOD_TYPES:
+        donors = [bt for bt in model.BLOOD_TYPES if r in model.COMPATIBILITY[bt]]
+        donors.sort(key=lambda bt: (bt != r, model.ISSUE_COST[bt]))
+        prefs.append([code[bt] for bt in donors])
+    return prefs
+
+def simulate(stock, demand_rate, donation_rate, days=model.FORECAST_DAYS, paths=10000,
+             seed=None):
+    """Run *paths* futures of *days* days for every blood type at once.
+
+    *stock* is a (types, shelf_life) array of units by days of life left
+    (column 0 expires at the end of the first day); *demand_rate* and
+    *donation_rate* are expected daily units, shaped (types,) or (types, days).
+    Returns a dict of per-type arrays: ``stockout_prob`` (share of paths with
+    any unmet demand), ``expected_shortfall`` (mean unmet units per path),
+    ``expected_waste`` and ``expected_end_stock``.
+
+    With one shelf life for every unit, a FIFO queue is also ordered by
+    expiry, so each (path, type) only needs the cumulative units received
+    and removed (issued or discarded): the units expiring tonight are those
+    received by their expiry date and not yet removed. That keeps the daily
+    step at a handful of (paths, types) array operations."""
+    rng = np.random.default_rng(seed)
+    k, life = stock.shape
+    demand = rng.poisson(np.broadcast_to(np.asarray(demand_rate, float).reshape(k, -1),
+                                         (k, days)), size=(paths, k, days))
+    donated = rng.poisson(np.broadcast_to(np.asarray(donation_rate, float).reshape(k, -1),
+                                          (k, days)), size=(paths, k, days)).cumsum(axis=2)
+    expiring_stock = np.asarray(stock).cumsum(axis=1)      # initial units gone by end of day j
+    prefs = donor_preferences()
+    # recipients with the fewest compatible types are served first
+    order = sorted(range(k), key=lambda r: len(prefs[r]))
+    removed = np.zeros((paths, k), dtype=np.int64)
+    shortfall = np.zeros((paths, k), dtype=np.int64)
+    waste = np.zeros((paths, k), dtype=np.int64)
+    for day in range(days):
+        received = expiring_stock[:, -1] + donated[:, :, day]
+        available = received - removed
+        for r in order:
+            need = demand[:, r, day]
+            for d in prefs[r]:
+                take = np.minimum(need, available[:, d])
+                available[:, d] -= take
+                need = need - take
+            shortfall[:, r] += need
+        removed = received - available
+        # units received by tonight's expiry date and still on the shelf are discarded
+        due = expiring_stock[:, min(day, life - 1)]
+        if day >= life - 1:
+            due = due + donated[:, :, day - life + 1]
+        expired = np.maximum(due - removed, 0)
+        waste += expired
+        removed += expired
+    return {"stockout_prob": (shortfall > 0).mean(axis=0),
+            "expected_shortfall": shortfall.mean(axis=0),
+            "expected_waste": waste.mean(axis=0),
+            "expected_end_stock": (received - removed).mean(axis=0)}
+
+def current_state(today=None, days=model.FORECAST_DAYS):
+    """Return (stock, demand_rate, donation_rate) for simulate() from the database.
+
+    The simulation starts tomorrow, the first day the forecast covers."""
+    import forecasting
+    today = model.to_day(today or date.today())
+    life = model.SHELF_LIFE_DAYS[model.PRODUCT]
+    code = {bt: i for i, bt in enumerate(model.BLOOD_TYPES)}
+    k = len(model.BLOOD_TYPES)
+    stock = np.zeros((k, life), dtype=np.int64)
+    for bt, day, units in model.execute(
+            "SELECT blood_type, donation_date, units FROM inventory WHERE donation_date >= ?",
+            (model.expiry_cutoff(today + 1),)):
+        left = day + life - 1 - (today + 1)     # days of life left after the first day
+        if bt in code and 0 <= left < life:
+            stock[code[bt], left] += units
+    types, start, Y = forecasting.daily_demand(model.from_day(today))
+    demand_rate = forecasting.forecast("weekday_mean", forecasting.fit("weekday_mean", Y, start), days)
+    # every donated unit is still in stock, was transfused or was discarded
+    donation_rate = np.zeros(k)
+    first = today - DONATION_WINDOW + 1
+    for bt, units in model.execute(
+            """SELECT blood_type, SUM(units) FROM (
+                   SELECT blood_type, units FROM inventory WHERE donation_date BETWEEN ?1 AND ?2
+                   UNION ALL
+                   SELECT blood_type, units FROM transfusions WHERE donation_date BETWEEN ?1 AND ?2
+                   UNION ALL
+                   SELECT blood_type, units FROM waste WHERE donation_date BETWEEN ?1 AND ?2)
+               GROUP BY blood_type""", (first, today)):
+        if bt in code:
+            donation_rate[code[bt]] = units / DONATION_WINDOW
+    return stock, demand_rate, donation_rate
+
+def stockout_risk(days=model.FORECAST_DAYS, paths=10000, seed=None):
+    """Return dict blood_type -> (stock-out probability, expected shortfall units)."""
+    result = simulate(*current_state(days=days), days=days, paths=paths, seed=seed)
+    return {bt: (float(p), float(s)) for bt, p, s in zip(
+        model.BLOOD_TYPES, result["stockout_prob"], result["expected_shortfall"])}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo stock-out risk per blood type")
+    parser.add_argument("--db", default=model.DB_NAME)
+    parser.add_argument("--days", type=int, default=model.FORECAST_DAYS)
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    model.DB_NAME = args.db
+    model.init_db()
+    stock, demand_rate, donation_rate = current_state(days=args.days)
+    start = time.perf_counter()
+    result = simulate(stock, demand_rate, donation_rate, args.days, args.paths, args.seed)
+    seconds = time.perf_counter() - start
+    print(f"{args.paths} paths x {args.days} days x {len(model.BLOOD_TYPES)} types "
+          f"in {seconds:.2f} s")
+    print(f"{'type':<5} {'stock':>6} {'demand/d':>9} {'donated/d':>10} {'P(out)':>7} "
+          f"{'shortfall':>10} {'waste':>7} {'end stock':>10}")
+    for i, bt in enumerate(model.BLOOD_TYPES):
+        print(f"{bt:<5} {stock[i].sum():>6} {np.mean(demand_rate[i]):>9.2f} "
+              f"{donation_rate[i]:>10.2f} {result['stockout_prob'][i]:>7.1%} "
+              f"{result['expected_shortfall'][i]:>10.1f} {result['expected_waste'][i]:>7.1f} "
+              f"{result['expected_end_stock'][i]:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# startup_check.py – guard the cold-start cost of model.py
+#
+#   python startup_check.py                 # default budget
+#   python startup_check.py --budget 0.25 --runs 7
+#
+# Imports model.py in fresh interpreters, takes the best of several runs,
+# and fails (exit status 1) if that exceeds the budget or if any of the
+# heavy libraries that model.py loads on first use were pulled in eagerly.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "reportlab", "sklearn", "openpyxl"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import model
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+def measure(runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=here,
+                             capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Check model.py import time")
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="maximum best-of-runs import time in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    best = min(r["seconds"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    print(f"import model: best {best * 1000:.1f} ms over {args.runs} runs "
+          f"(budget {args.budget * 1000:.0f} ms)")
+    failed = False
+    if loaded:
+        print("FAIL: heavy modules imported at startup:", ", ".join(loaded))
+        failed = True
+    if best > args.budget:
+        print("FAIL: startup over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# stress_allocation.py – concurrent allocation and donation stress test
+#
+#   python stress_allocation.py                          # 8 threads, then 4 processes x 4 threads
+#   python stress_allocation.py --threads 16 --processes 0 --seconds 10
+#
+# Workers hammer one scratch database with allocate_from() (recorded in the
+# transfusions table under a unique recipient id) and record_donation().
+# Afterwards every batch is checked: units at the start plus units donated
+# must equal units still in stock plus units transfused, no batch may go
+# negative, and the units each worker was told it received must match the
+# transfusions table batch by batch - so a unit handed out twice, or
+# handed out without being recorded, fails the run (exit status 1).
+import argparse
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import model
+
+DAYS = 30                   # days of fresh stock in the scratch inventory
+
+def setup(db, seed):
+    """Create the scratch database; returns {(blood_type, day): units} at the start."""
+    rng = random.Random(seed)
+    model.DB_NAME = db
+    model.init_db()
+    today = model.today_day()
+    batches = [(bt, today - d, rng.randint(100, 300)) for bt in model.BLOOD_TYPES
+               for d in range(DAYS)]
+    with model.transaction("IMMEDIATE"):
+        model.executemany("INSERT INTO donors (donor_id, name, blood_type) VALUES (?,?,?)",
+                          [(f"D-{bt}", bt, bt) for bt in model.BLOOD_TYPES])
+        model.executemany(model.INVENTORY_UPSERT, batches)
+    model.close_connections()
+    return {(bt, d): u for bt, d, u in batches}
+
+def worker(db, name, seconds, seed):
+    """Allocate and donate until the deadline; returns what this worker did."""
+    rng = random.Random(seed)
+    model.DB_NAME = db
+    today = model.today_day()
+    allocated, donated, latencies = Counter(), Counter(), []
+    ops = shortages = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if rng.random() < 0.8:
+            recipient = rng.choice(model.BLOOD_TYPES)
+            donors = [bt for bt in model.COMPATIBILITY if recipient in model.COMPATIBILITY[bt]]
+            result = model.allocate_from(donors, rng.randint(1, 4), f"{name}-{ops}")
+            if result is None:
+                shortages += 1
+            else:
+                bt, batches = result
+                for when, units in batches:
+                    allocated[(bt, model.to_day(when))] += units
+        else:
+            bt, day, units = rng.choice(model.BLOOD_TYPES), today - rng.randrange(DAYS), rng.randint(1, 3)
+            model.record_donation(f"D-{bt}", units, day)
+            donated[(bt, day)] += units
+        latencies.append(time.perf_counter() - start)
+        ops += 1
+    return {"ops": ops, "shortages": shortages, "allocated": allocated,
+            "donated": donated, "latencies": latencies}
+
+def _threads(db, prefix, threads, seconds, seed):
+    results = [None] * threads
+
+    def run(i):
+        results[i] = worker(db, f"{prefix}t{i}", seconds, seed * 1000 + i)
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    model.close_connections()
+    return results, model.busy_retries
+
+def run(db, processes, threads, seconds, seed):
+    """Run the workers; returns (worker results, busy retries, wall seconds)."""
+    start = time.perf_counter()
+    if processes:
+        with ProcessPoolExecutor(processes, mp_context=mp.get_context("spawn")) as pool:
+            futures = [pool.submit(_threads, db, f"p{p}", threads, seconds, seed + p)
+                       for p in range(processes)]
+            parts = [f.result() for f in futures]
+        results = [r for rs, _ in parts for r in rs]
+        retries = sum(n for _, n in parts)
+    else:
+        before = model.busy_retries
+        results, after = _threads(db, "p0", threads, seconds, seed)
+        retries = after - before
+    return results, retries, time.perf_counter() - start
+
+def verify(db, initial, results):
+    """Return a list of problems found; empty means no unit was double-allocated."""
+    model.DB_NAME = db
+    allocated, donated = Counter(), Counter()
+    for r in results:
+        allocated.update(r["allocated"])
+        donated.update(r["donated"])
+    stock = Counter({(bt, d): u for bt, d, u in model.execute(
+        "SELECT blood_type, donation_date, units FROM inventory")})
+    transfused = Counter({(bt, d): u for bt, d, u in model.execute(
+        "SELECT blood_type, donation_date, SUM(units) FROM transfusions GROUP BY 1, 2")})
+    problems = []
+    for key in sorted(set(initial) | set(donated) | set(stock) | set(transfused)):
+        received = initial.get(key, 0) + donated[key]
+        if stock[key] < 0:
+            problems.append(f"{key}: negative stock {stock[key]}")
+        if stock[key] + transfused[key] != received:
+            problems.append(f"{key}: {received} received but {stock[key]} in stock "
+                            f"+ {transfused[key]} transfused")
+        if allocated[key] != transfused[key]:
+            problems.append(f"{key}: workers were given {allocated[key]} units, "
+                            f"transfusions record {transfused[key]}")
+    duplicates = model.execute("""SELECT COUNT(*) FROM (SELECT recipient_id FROM transfusions
+                                  GROUP BY recipient_id, blood_type, donation_date
+                                  HAVING COUNT(*) > 1)""")[0][0]
+    if duplicates:
+        problems.append(f"{duplicates} batches issued twice to the same request")
+    model.close_connections()
+    return problems
+
+def report(label, results, retries, wall, problems):
+    latencies = sorted(l for r in results for l in r["latencies"])
+    ops = sum(r["ops"] for r in results)
+    units = sum(sum(r["allocated"].values()) for r in results)
+    pct = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    print(f"{label}: {ops} ops in {wall:.1f} s = {ops / wall:,.0f} ops/s, "
+          f"{units} units allocated, {sum(r['shortages'] for r in results)} shortages, "
+          f"{retries} busy retries")
+    if latencies:
+        print(f"  latency p50 {pct(0.5):.2f} ms  p95 {pct(0.95):.2f} ms  p99 {pct(0.99):.2f} ms")
+    print("  consistency: " + ("OK" if not problems else f"{len(problems)} problems"))
+    for p in problems[:20]:
+        print("   ", p)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress concurrent allocation")
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="worker processes for the second run (0 to skip)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="blood-stress-")
+    failed = False
+    try:
+        runs = [("threads", 0, args.threads)]
+        if args.processes:
+            runs.append(("processes", args.processes, max(1, args.threads // 2)))
+        for label, processes, threads in runs:
+            db = os.path.join(scratch, f"{label}.db")
+            initial = setup(db, args.seed)
+            results, retries, wall = run(db, processes, threads, args.seconds, args.seed)
+            problems = verify(db, initial, results)
+            report(f"{label} ({max(processes, 1)} x {threads})", results, retries, wall, problems)
+            failed |= bool(problems)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
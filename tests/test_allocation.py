@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+
+POS = {bt: i for i, bt in enumerate(model.BLOOD_TYPES)}
+
+
+def vector(**units):
+    v = [0] * len(model.BLOOD_TYPES)
+    for name, u in units.items():
+        v[POS[name.replace("neg", "-").replace("pos", "+")]] = u
+    return v
+
+
+class MinCostFlowTest(unittest.TestCase):
+    def test_prefers_least_universal_donor(self):
+        flow = model._min_cost_flow(vector(Oneg=5, Apos=5), vector(Apos=3))
+        self.assertEqual(flow[POS["A+"]][POS["A+"]], 3)
+        self.assertEqual(sum(flow[POS["O-"]]), 0)
+
+    def test_meets_demand_within_supply(self):
+        supply, demand = vector(Oneg=4, Apos=3), vector(Apos=4, Oneg=3)
+        flow = model._min_cost_flow(supply, demand)
+        for r, want in enumerate(demand):
+            self.assertEqual(sum(flow[d][r] for d in range(len(flow))), want)
+        for d, have in enumerate(supply):
+            self.assertLessEqual(sum(flow[d]), have)
+        self.assertEqual(flow[POS["O-"]][POS["O-"]], 3)
+
+
+class PlanBatchAllocationTest(unittest.TestCase):
+    def test_oldest_batches_first(self):
+        plan = model.plan_batch_allocation([("R1", "A+", 3)], {"A+": [(100, 2), (101, 5)]})
+        self.assertEqual(plan, {"R1": [("A+", 100, 2), ("A+", 101, 1)]})
+
+    def test_o_negative_kept_for_o_negative_recipients(self):
+        stock = {"O-": [(100, 4)], "A+": [(100, 3)]}
+        plan = model.plan_batch_allocation([("RA", "A+", 4), ("RO", "O-", 3)], stock)
+        self.assertEqual(plan["RO"], [("O-", 100, 3)])
+        self.assertEqual(sorted(plan["RA"]), [("A+", 100, 3), ("O-", 100, 1)])
+
+    def test_admission_keeps_the_set_feasible_in_priority_order(self):
+        stock = {"O-": [(100, 2)], "A+": [(100, 3)]}
+        plan = model.plan_batch_allocation([("RA", "A+", 5), ("RO", "O-", 2)], stock)
+        self.assertEqual(set(plan), {"RA"})
+        self.assertEqual(sum(u for _, _, u in plan["RA"]), 5)
+
+    def test_without_split_each_request_uses_one_type(self):
+        stock = {"O-": [(100, 4)], "A+": [(100, 3)]}
+        requests = [("RA", "A+", 4), ("RO", "O-", 3)]
+        plan = model.plan_batch_allocation(requests, stock, allow_split=False)
+        self.assertEqual(plan, {"RA": [("O-", 100, 4)]})
+        self.assertEqual(set(model.plan_batch_allocation(requests, stock)), {"RA", "RO"})
+
+
+class AllocationDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME
+        model.DB_NAME = os.path.join(self.dir.name, "alloc.db")
+        model.init_db()
+        self.today = model.today_day()
+        with model.transaction("IMMEDIATE"):
+            model.executemany(model.INVENTORY_UPSERT, [("O-", self.today - 2, 4),
+                                                       ("A+", self.today - 3, 2),
+                                                       ("A+", self.today - 1, 5)])
+        model.INVENTORY.version = None
+        model.add_recipient("RA", "Ann", "A+", 3)
+        model.add_recipient("RO", "Otto", "O-", 2)
+
+    def tearDown(self):
+        model.close_connections()
+        model.DB_NAME = self.saved
+        self.dir.cleanup()
+
+    def transfused(self):
+        return model.execute("""SELECT recipient_id, blood_type, donation_date, units
+                                FROM transfusions ORDER BY 1, 2, 3""")
+
+    def test_allocate_batch_writes_back(self):
+        plan, pending = model.allocate_batch(dry_run=True)
+        self.assertEqual(pending, 2)
+        self.assertEqual(self.transfused(), [])
+        self.assertEqual(model.stock_levels(), {"O-": 4, "A+": 7})
+
+        plan, pending = model.allocate_batch()
+        t = self.today
+        self.assertEqual(self.transfused(), [("RA", "A+", t - 3, 2), ("RA", "A+", t - 1, 1),
+                                             ("RO", "O-", t - 2, 2)])
+        self.assertEqual(model.execute("""SELECT blood_type, donation_date, units FROM inventory
+                                          ORDER BY 1, 2"""),
+                         [("A+", t - 1, 4), ("O-", t - 2, 2)])
+        self.assertEqual(model.stock_levels(), {"O-": 2, "A+": 4})
+        self.assertEqual(model.pending_requests(), [])
+        self.assertEqual(model.allocate_batch(), ({}, 0))
+
+    def test_request_is_never_issued_twice(self):
+        before = sum(model.stock_levels().values())
+        name, needed, bt, _ = model.process_transfusion("RA")
+        self.assertIsNotNone(bt)
+        with self.assertRaises(model.AlreadyFulfilledError):
+            model.process_transfusion("RA")
+        self.assertEqual(sum(u for _, _, _, u in self.transfused()), 3)
+        self.assertEqual(sum(model.stock_levels().values()), before - 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
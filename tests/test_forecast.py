@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+
+
+def _today_is(day):
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return day
+    return mock.patch.object(model, "date", FixedDate)
+
+
+class CachedModelTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME
+        model.DB_NAME = os.path.join(self.dir.name, "forecast.db")
+        model.init_db()
+        self.start = date.today()
+        # a rising 60-day series of A+ requests, one per day
+        model.executemany("""INSERT INTO recipients (recipient_id, name, blood_type,
+                                                     required_units, request_date)
+                             VALUES (?,?,?,?,?)""",
+                          [(f"R{i}", "R", "A+", 1 + i // 10, model.to_day(self.start) - 59 + i)
+                           for i in range(60)])
+
+    def tearDown(self):
+        model.close_connections()
+        model.DB_NAME = self.saved
+        self.dir.cleanup()
+
+    def test_cached_model_matches_fresh_fit_days_later(self):
+        with _today_is(self.start):
+            cached = model.train_demand_model()
+        for later in (1, 10):
+            with _today_is(self.start + timedelta(days=later)):
+                fresh = model.train_demand_model()
+                horizons = [1, 7, 30]
+                for a, b in zip(model.predict_horizons(cached, horizons).ravel(),
+                                model.predict_horizons(fresh, horizons).ravel()):
+                    self.assertAlmostEqual(a, b, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+
+# The schema init_db() created before migrations existed.
+LEGACY_SCHEMA = """
+CREATE TABLE donors (donor_id TEXT PRIMARY KEY, name TEXT NOT NULL,
+                     blood_type TEXT NOT NULL, last_donation TEXT);
+CREATE TABLE recipients (recipient_id TEXT PRIMARY KEY, name TEXT NOT NULL,
+                         blood_type TEXT NOT NULL, required_units INTEGER NOT NULL,
+                         request_date TEXT NOT NULL);
+CREATE TABLE inventory (blood_type TEXT, donation_date TEXT, units INTEGER,
+                        PRIMARY KEY (blood_type, donation_date));
+"""
+
+
+class LegacyMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME
+        model.DB_NAME = os.path.join(self.dir.name, "legacy.db")
+        today = model.from_day(model.today_day()).isoformat()
+        conn = sqlite3.connect(model.DB_NAME)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany("INSERT INTO donors VALUES (?,?,?,?)",
+                         [("D1", "Ann", "O-", "2024-01-05"), ("D2", "Bob", "A+", None)])
+        conn.executemany("INSERT INTO recipients VALUES (?,?,?,?,?)",
+                         [("R1", "Cy", "A+", 2, "2024-01-06"), ("R2", "Di", "O-", 1, "2024-01-07")])
+        conn.executemany("INSERT INTO inventory VALUES (?,?,?)",
+                         [("O-", today, 4), ("A+", today, 3)])
+        conn.commit()
+        conn.close()
+        model.INVENTORY.version = None
+
+    def tearDown(self):
+        model.close_connections()
+        model.DB_NAME = self.saved
+        self.dir.cleanup()
+
+    def test_legacy_requests_are_not_pending(self):
+        model.init_db()
+        self.assertEqual(model.execute("PRAGMA user_version")[0][0], model.SCHEMA_VERSION)
+        self.assertEqual(model.pending_requests(), [])
+        self.assertEqual(model.allocate_batch(), ({}, 0))
+        self.assertEqual(model.stock_levels(), {"O-": 4, "A+": 3})
+
+    def test_dates_without_zero_padding_are_converted(self):
+        conn = sqlite3.connect(model.DB_NAME)
+        conn.execute("INSERT INTO inventory VALUES ('B+', '2026-10-5', 2)")
+        conn.execute("UPDATE donors SET last_donation='2024-1-5' WHERE donor_id='D1'")
+        conn.commit()
+        conn.close()
+        model.init_db()
+        self.assertEqual(model.execute("SELECT last_donation FROM donors WHERE donor_id='D1'"),
+                         [(model.to_day("2024-01-05"),)])
+        self.assertEqual(model.execute("SELECT donation_date FROM inventory WHERE blood_type='B+'"),
+                         [(model.to_day("2026-10-05"),)])
+        self.assertEqual(model.execute("SELECT COUNT(*) FROM inventory "
+                                       "WHERE donation_date IS NULL")[0][0], 0)
+
+    def test_unreadable_date_aborts_migration(self):
+        conn = sqlite3.connect(model.DB_NAME)
+        conn.execute("INSERT INTO inventory VALUES ('B+', '5/10/2026', 2)")
+        conn.commit()
+        conn.close()
+        with self.assertRaisesRegex(ValueError, "inventory.donation_date = '5/10/2026'"):
+            model.init_db()
+        self.assertEqual(model.execute("PRAGMA user_version")[0][0], 0)
+        self.assertEqual(model.execute("SELECT COUNT(*) FROM inventory")[0][0], 3)
+
+    def test_new_requests_are_pending_until_served(self):
+        model.init_db()
+        model.add_recipient("R3", "Ed", "A+", 2)
+        self.assertEqual(model.pending_requests(), [("R3", "A+", 2)])
+        model.process_transfusion("R3")
+        self.assertEqual(model.pending_requests(), [])
+
+
+class DemandFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME
+        model.DB_NAME = os.path.join(self.dir.name, "demand.db")
+        model.init_db()
+        model.add_recipient("R1", "A", "A+", 2)
+
+    def tearDown(self):
+        model.close_connections()
+        model.DB_NAME = self.saved
+        self.dir.cleanup()
+
+    def test_swapping_blood_type_changes_fingerprint(self):
+        before = model._demand_fingerprint()
+        model.execute("DELETE FROM recipients WHERE recipient_id='R1'")
+        model.add_recipient("R2", "B", "B+", 2)
+        self.assertNotEqual(model._demand_fingerprint(), before)
+
+    def test_other_database_never_matches(self):
+        before = model._demand_fingerprint()
+        model.close_connections()
+        os.remove(model.DB_NAME)
+        model.init_db()
+        model.add_recipient("R1", "A", "A+", 2)
+        self.assertNotEqual(model._demand_fingerprint(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
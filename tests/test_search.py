@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+
+
+class DonorSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME
+        model.DB_NAME = os.path.join(self.dir.name, "search.db")
+        model.init_db()
+        if not model.execute("SELECT 1 FROM sqlite_master WHERE name='donor_names'"):
+            self.skipTest("SQLite built without FTS5")
+
+    def tearDown(self):
+        model.close_connections()
+        model._donor_fts.pop(model.DB_NAME, None)
+        model.DB_NAME = self.saved
+        self.dir.cleanup()
+
+    def add(self, names):
+        with model.transaction("IMMEDIATE"):
+            model.executemany("INSERT INTO donors (donor_id, name, blood_type) VALUES (?,?,?)",
+                              [(f"D{i}", n, "O+") for i, n in enumerate(names)])
+
+    def names(self, text, limit=20):
+        return [name for _, name, _, _ in model.search_donors(text, limit)]
+
+    def test_whole_word_match_beyond_prefix_candidates(self):
+        self.add([f"Annabel {i}" for i in range(model.SEARCH_CANDIDATES * 2)] + ["Ann Lee"])
+        found = self.names("Ann")
+        self.assertEqual(found[0], "Ann Lee")
+        self.assertEqual(len(found), 20)
+        self.assertTrue(all(n.startswith("Annabel") for n in found[1:]))
+
+    def test_index_follows_donors_through_vacuum(self):
+        self.add([f"Filler {i}" for i in range(200)] + ["Ann Lee", "Bob Stone"])
+        model.execute("DELETE FROM donors WHERE name LIKE 'Filler %'")
+        model.close_connections()
+        conn = model.get_connection()
+        conn.execute("VACUUM")
+        self.assertEqual(self.names("ann"), ["Ann Lee"])
+        self.assertEqual(self.names("sto"), ["Bob Stone"])
+        model.execute("UPDATE donors SET name='Ann Stone' WHERE donor_id='D200'")
+        self.assertEqual(self.names("sto"), ["Ann Stone", "Bob Stone"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import blood_service
+import model
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.saved = model.DB_NAME, model.JOURNAL
+        model.DB_NAME = os.path.join(self.dir.name, "service.db")
+        model.JOURNAL = model.ActivityJournal(os.path.join(self.dir.name, "journal.jsonl"))
+        model.init_db()
+        model.add_donor("D1", "Donor 1", "O-")
+        model.record_donation("D1", 3, model.today_day())
+
+    def tearDown(self):
+        model.JOURNAL.flush()
+        model.close_connections()
+        model.DB_NAME, model.JOURNAL = self.saved
+        self.dir.cleanup()
+
+    def post(self, path, body):
+        async def run():
+            service = blood_service.BloodService(readers=1)
+            writer = asyncio.create_task(service._write_loop())
+            try:
+                return await service.dispatch("POST", path, json.dumps(body).encode())
+            finally:
+                writer.cancel()
+                service.readers.shutdown()
+                service.writer.shutdown()
+        return asyncio.run(run())
+
+    def test_rejects_non_positive_units(self):
+        for units in (-5, 0):
+            status, payload = self.post("/donations", {"donor_id": "D1", "units": units})
+            self.assertEqual(status, 400)
+            self.assertIn("positive", payload["error"])
+        self.assertEqual(model.stock_levels(), {"O-": 3})
+        self.assertEqual(model.execute("SELECT MIN(units) FROM inventory")[0][0], 3)
+
+    def test_rejects_non_positive_required_units(self):
+        status, _ = self.post("/recipients", {"recipient_id": "R1", "name": "R",
+                                              "blood_type": "O-", "required_units": -2})
+        self.assertEqual(status, 400)
+        self.assertEqual(model.execute("SELECT COUNT(*) FROM recipients")[0][0], 0)
+
+    def test_donation_date_formats(self):
+        status, payload = self.post("/donations", {"donor_id": "D1", "units": 1,
+                                                   "donation_date": "2024-1-5"})
+        self.assertEqual(status, 201)
+        self.assertEqual(payload["donation_date"], "2024-01-05")
+        status, _ = self.post("/donations", {"donor_id": "D1", "units": 1,
+                                             "donation_date": "05/01/2024"})
+        self.assertEqual(status, 400)
+
+    def test_repeated_transfusion_is_a_conflict(self):
+        model.add_recipient("R1", "R", "O-", 2)
+        self.assertEqual(self.post("/transfusions", {"recipient_id": "R1"})[0], 200)
+        status, payload = self.post("/transfusions", {"recipient_id": "R1"})
+        self.assertEqual(status, 409)
+        self.assertIn("already fulfilled", payload["error"])
+        self.assertEqual(model.stock_levels(), {"O-": 1})
+
+    def test_accepts_positive_units(self):
+        status, _ = self.post("/donations", {"donor_id": "D1", "units": 2})
+        self.assertEqual(status, 201)
+        self.assertEqual(model.stock_levels(), {"O-": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()